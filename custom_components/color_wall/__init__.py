@@ -6,14 +6,27 @@ import logging
 
 from homeassistant.config_entries import ConfigEntry
 from homeassistant.core import HomeAssistant
-
-from .api import API
+from homeassistant.helpers.aiohttp_client import async_get_clientsession
+from homeassistant.helpers.storage import Store
+
+from .api import AsyncAPI
+from .coordinator import ColorWallCoordinator
+from .push import async_setup_push
+from .scheduler import RefreshScheduler
+from .stream import FrameStream
+from .transition import TransitionScheduler
 from . import effect
 
 DOMAIN = "color_wall"
-PLATFORMS = ["light"]
+PLATFORMS = ["light", "sensor"]
 CONTROLLER = "controller"
+COORDINATOR = "coordinator"
 UNDO_UPDATE_LISTENER = "undo_update_listener"
+UNDO_PUSH = "undo_push"
+TRANSITIONS = "transitions"
+STREAM = "stream"
+SCHEDULER = "scheduler"
+STORAGE_VERSION = 1
 
 _LOGGER = logging.getLogger(__name__)
 
@@ -21,6 +34,12 @@ _LOGGER = logging.getLogger(__name__)
 async def async_setup(hass: HomeAssistant, config: dict):
     """Set up the ColorWall component"""
     hass.data.setdefault(DOMAIN, {})
+    # Shared by all walls, staggers their polls and limits the requests in flight to them
+    hass.data[DOMAIN].setdefault(SCHEDULER, RefreshScheduler())
+
+    # Imported here as the services module needs the constants above
+    from .services import async_setup_services
+    async_setup_services(hass)
 
     return True
 
@@ -43,9 +62,19 @@ async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
         )
 
     if "host" in entry.data:
+        scheduler = hass.data[DOMAIN][SCHEDULER]
+        controller = AsyncAPI(entry.data["host"], async_get_clientsession(hass), limiter=scheduler)
+        controller.configureEffects(effect.configuredEffects(fixDict(entry.options)))
+        coordinator = ColorWallCoordinator(hass, controller, _store(hass, entry), scheduler)
+        # May store a new webhook id in the entry, which must happen before the update listener reloads on it
+        undoPush = async_setup_push(hass, entry, coordinator)
         hass.data[DOMAIN][entry.entry_id] = {
-            CONTROLLER: API(entry.data["host"]),
-            UNDO_UPDATE_LISTENER: entry.add_update_listener(update_listener)
+            CONTROLLER: controller,
+            COORDINATOR: coordinator,
+            TRANSITIONS: TransitionScheduler(controller),
+            STREAM: FrameStream(controller),
+            UNDO_UPDATE_LISTENER: entry.add_update_listener(update_listener),
+            UNDO_PUSH: undoPush
         }
 
     for component in PLATFORMS:
@@ -66,7 +95,13 @@ async def async_unload_entry(hass: HomeAssistant, entry: ConfigEntry):
             ]
         )
     )
-    hass.data[DOMAIN][entry.entry_id][UNDO_UPDATE_LISTENER]()
+    data = hass.data[DOMAIN][entry.entry_id]
+    data[UNDO_UPDATE_LISTENER]()
+    data[UNDO_PUSH]()
+    data[TRANSITIONS].cancel()
+    await data[STREAM].async_stop()
+    data[CONTROLLER].commands.cancel()
+    hass.data[DOMAIN][SCHEDULER].unregister(data[CONTROLLER].ip)
 
     if unload_ok:
         hass.data[DOMAIN].pop(entry.entry_id)
@@ -74,6 +109,16 @@ async def async_unload_entry(hass: HomeAssistant, entry: ConfigEntry):
     return unload_ok
 
 
+async def async_remove_entry(hass: HomeAssistant, entry: ConfigEntry):
+    """Remove the state stored for a deleted config entry"""
+    await _store(hass, entry).async_remove()
+
+
+def _store(hass, entry):
+    """The store holding the last known state of the wall of the entry"""
+    return Store(hass, STORAGE_VERSION, f"{DOMAIN}.{entry.entry_id}")
+
+
 async def update_listener(hass, entry):
     """Handle options update."""
     await hass.config_entries.async_reload(entry.entry_id)
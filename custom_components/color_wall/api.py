@@ -1,162 +1,663 @@
+import asyncio
+import contextlib
 import http.client
 import json
 import logging
+import socket
+import time
 from types import SimpleNamespace
-from .panel import Panel
-from .panel import PanelEncoder
+
+import aiohttp
+
+from .commands import DEFAULT_WRITE_WINDOW, CommandQueue
+from .metrics import WallMetrics
+from .panel import PanelPayloadEncoder, PanelStore
+from .profiling import profiled
 from . import effect
 from .effect import EffectEncoder
 from .effect import effectById
+from .effect import encodeEffect
 
 _LOGGER = logging.getLogger(__name__)
 
 
-class API:
+JSON_HEADERS = {
+    'Content-Type': 'application/json'
+}
+
+# Seconds to wait for the device to accept a connection and to answer once connected
+CONNECT_TIMEOUT = 5
+READ_TIMEOUT = 10
+
+POWER = "power"
+PANELS = "panels"
+EFFECT = "effect"
+
+# Answers to PATCH /panels from firmware that cannot update single panels
+PATCH_UNSUPPORTED = (http.HTTPStatus.NOT_FOUND, http.HTTPStatus.METHOD_NOT_ALLOWED)
+
+# Order the queued commands of a wall are sent in, lower first
+COMMAND_PRIORITIES = {
+    POWER: 0,
+    EFFECT: 1,
+    PANELS: 2,
+}
+
+# Seconds the data read from each endpoint stays fresh before a refresh reads it again
+# The effect only changes when we set it, so it does not need to be read every cycle
+DEFAULT_FRESHNESS = {
+    POWER: 0,
+    PANELS: 0,
+    EFFECT: 300,
+}
+
+
+class CircuitBreaker:
+    """Makes calls to a host fail fast while it is known to be down
+
+    After `threshold` failures in a row the breaker opens and calls are short-circuited
+    without touching the network. Once `resetTimeout` seconds have passed a single call is
+    let through as a probe, which closes the breaker again if it succeeds.
+
+    The async client counts a whole refresh or command as one call, however many requests
+    it sends, so a poll reading three endpoints fails once and its probe is not cut short."""
+
+    def __init__(self, host, threshold=3, resetTimeout=30):
+        self.host = host
+        self.threshold = threshold
+        self.resetTimeout = resetTimeout
+        self.failures = 0
+        self.openedAt = None
+        self.probing = False
+        self.trips = 0
+        self.shortCircuited = 0
+
+    @property
+    def state(self):
+        if self.openedAt is None:
+            return "closed"
+        return "half_open" if self.probing else "open"
+
+    def allow(self):
+        """Returns whether a call may go to the device, counting the ones that may not"""
+        if self.openedAt is None:
+            return True
+        if not self.probing and time.monotonic() - self.openedAt >= self.resetTimeout:
+            self.probing = True
+            return True
+        self.shortCircuited += 1
+        return False
+
+    def succeeded(self):
+        if self.openedAt is not None:
+            _LOGGER.info("%s is reachable again", self.host)
+        self.failures = 0
+        self.openedAt = None
+        self.probing = False
+
+    def abandoned(self):
+        """A call ended without telling whether the host is reachable, the next one may probe"""
+        self.probing = False
+
+    def failed(self):
+        self.failures += 1
+        if self.probing or (self.openedAt is None and self.failures >= self.threshold):
+            if self.openedAt is None:
+                self.trips += 1
+                _LOGGER.warning("%s failed %d times in a row, pausing calls to it", self.host, self.failures)
+            self.openedAt = time.monotonic()
+            self.probing = False
+
+
+_breakers = {}
+
+
+def circuitBreaker(host):
+    """Returns the circuit breaker of the host, shared by every client talking to it"""
+    if host not in _breakers:
+        _breakers[host] = CircuitBreaker(host)
+    return _breakers[host]
+
+
+def parsePower(data):
+    """Turns the body of GET /power into a namespace with power and brightness"""
+    return json.loads(data.decode("utf-8"), object_hook=lambda d: SimpleNamespace(**d))
+
+
+@profiled("parsePanels")
+def parsePanels(data):
+    """Turns the body of GET /panels into a list of panel records for PanelStore.load"""
+    return json.loads(data)
+
+
+def parseEffect(data):
+    """Turns the body of GET /effect into the matching effect"""
+    x = json.loads(data.decode("utf-8"), object_hook=lambda d: SimpleNamespace(**d))
+    if hasattr(x, 'settings'):
+        return effectById(x.effect, x.settings)
+    else:
+        return effectById(x.effect, None)
+
+
+class BaseAPI:
+    """State of a wall shared by the sync and async clients"""
 
     def __init__(self, ip):
         self.ip = ip
         self.powered = False
         self.brightness = 255
-        self.panels = []
+        self.panels = PanelStore()
+        self.panelEncoder = PanelPayloadEncoder()
         self.effectSettings = {}
+        self.effectPayloads = {}
         self.currentEffect = None
+        self.metrics = WallMetrics()
+
+    @profiled("BaseAPI.configureEffects")
+    def configureEffects(self, configured):
+        """Sets the effects configured for this wall and caches the /effect body of each
+           Called whenever the entry is loaded, which happens again after the options change
+
+        @param configured: dict of effect id to Effect
+        """
+        self.effectSettings = configured
+        self.effectPayloads = {eId: encodeEffect(e) for eId, e in configured.items()}
+
+    def dumpState(self):
+        """Returns the cached state of the wall as a dict that can be stored as JSON"""
+        return {
+            "power": self.powered,
+            "brightness": self.brightness,
+            "effect": json.loads(encodeEffect(self.currentEffect)) if self.currentEffect is not None else None,
+            "panels": self.panels.records(),
+        }
+
+    def restoreState(self, state):
+        """Fills the cache with a state returned by dumpState, without confirming it with the device"""
+        self.powered = state["power"]
+        self.brightness = state["brightness"]
+        stored = state.get("effect")
+        if stored is not None:
+            self.currentEffect = effectById(stored["effect"], effect.Settings(stored.get("settings", {})))
+        self.panels.load(state["panels"])
+
+    @staticmethod
+    def getEffectList():
+        return effect.effects
+
+    @staticmethod
+    def getEffectIdByName(name):
+        return effect.effectIdByName(name)
+
+    @staticmethod
+    def getEffectByName(name, settings):
+        return effect.effectByName(name, settings)
+
+
+class API(BaseAPI):
+
+    def __init__(self, ip):
+        super().__init__(ip)
+        self.breaker = circuitBreaker(ip)
+
+    def _request(self, method, path, payload=None):
+        """Sends a single request on a new connection and returns the status and body of the response"""
+        if not self.breaker.allow():
+            raise ColorWallConnectionError(f"{self.ip} is unreachable, not trying again yet")
+        headers = JSON_HEADERS if payload is not None else {}
+        metrics = self.metrics.endpoint(method, path)
+        metrics.requests += 1
+        metrics.bytesSent += len(payload) if payload is not None else 0
+        conn = http.client.HTTPConnection(self.ip, timeout=CONNECT_TIMEOUT)
+        started = time.perf_counter()
+        try:
+            conn.connect()
+            conn.sock.settimeout(READ_TIMEOUT)
+            conn.request(method, path, payload, headers)
+            res = conn.getresponse()
+            result = res.getcode(), res.read()
+        except OSError as err:
+            if isinstance(err, socket.timeout):
+                metrics.timeouts += 1
+            else:
+                metrics.errors += 1
+            self.breaker.failed()
+            raise ColorWallConnectionError from err
+        finally:
+            conn.close()
+        self.breaker.succeeded()
+        metrics.observe(time.perf_counter() - started)
+        metrics.bytesReceived += len(result[1])
+        if result[0] != http.HTTPStatus.OK:
+            metrics.errors += 1
+        return result
+
+    def _get(self, path):
+        status, data = self._request("GET", path)
+        if status != http.HTTPStatus.OK:
+            raise ColorWallConnectionError(f"GET {path} returned {status}")
+        return data
+
+    def _post(self, path, payload, what):
+        status, data = self._request("POST", path, payload)
+        if status == http.HTTPStatus.OK:
+            return True
+        else:
+            _LOGGER.error("%s returned an error: %s", what, data.decode("utf-8"))
+            return False
 
     def setPower(self, powered, brightness):
-        conn = http.client.HTTPConnection(self.ip)
         state = {
             "power": powered,
             "brightness": brightness
         }
-        payload = json.dumps(state)
-        _LOGGER.debug("Set power: " + str(payload))
-        headers = {
-            'Content-Type': 'application/json'
-        }
-        conn.request("POST", "/power", payload, headers)
-        res = conn.getresponse()
-        if res.getcode() == http.HTTPStatus.OK:
-            return True
-        else:
-            data = res.read()
-            _LOGGER.error("Set panels returned an error: %s", data.decode("utf-8"))
-            return False
+        payload = self.metrics.encode("POST", "/power", json.dumps, state)
+        _LOGGER.debug("Set power: %s", payload)
+        return self._post("/power", payload, "Set power")
 
     def getPower(self):
-        conn = http.client.HTTPConnection(self.ip)
-        payload = ''
-        headers = {}
-        conn.request("GET", "/power", payload, headers)
-        res = conn.getresponse()
-        data = res.read()
-        x = json.loads(data.decode("utf-8"), object_hook=lambda d: SimpleNamespace(**d))
-        return x
+        return self.metrics.decode("GET", "/power", parsePower, self._get("/power"))
 
     def getPanels(self):
-        conn = http.client.HTTPConnection(self.ip)
-        payload = ''
-        headers = {}
-        conn.request("GET", "/panels", payload, headers)
-        res = conn.getresponse()
-        data = res.read()
-        x = json.loads(data.decode("utf-8"), object_hook=lambda d: SimpleNamespace(**d))
-        panels = []
-        for p in x:
-            panels.append(Panel(p.id, p.hue, p.saturation, p.brightness))
-
-        return panels
+        records = self.metrics.decode("GET", "/panels", parsePanels, self._get("/panels"))
+        try:
+            self.panels.load(records)
+        except ValueError as err:
+            raise ColorWallConnectionError(f"{self.ip} sent invalid panels: {err}") from err
+        return self.panels
 
     def setPanels(self, panels):
         """
 
-        @type panels: list
+        @type panels: PanelStore
         """
-        conn = http.client.HTTPConnection(self.ip)
-        payload = json.dumps(panels, cls=PanelEncoder)
-        _LOGGER.debug("Set panels: " + str(payload))
-        headers = {
-            'Content-Type': 'application/json'
-        }
-        conn.request("POST", "/panels", payload, headers)
-        res = conn.getresponse()
-        if res.getcode() == http.HTTPStatus.OK:
-            return True
-        else:
-            data = res.read()
-            _LOGGER.error("Set panels returned an error: %s", data.decode("utf-8"))
-            return False
+        payload = self.metrics.encode("POST", "/panels", self.panelEncoder.encode, panels)
+        if _LOGGER.isEnabledFor(logging.DEBUG):
+            _LOGGER.debug("Set panels: %s", payload.decode("utf-8"))
+        return self._post("/panels", payload, "Set panels")
 
     def getEffect(self):
-        conn = http.client.HTTPConnection(self.ip)
-        payload = ''
-        headers = {}
-        conn.request("GET", "/effect", payload, headers)
-        res = conn.getresponse()
-        data = res.read()
-        print(data.decode("utf-8"))
-        x = json.loads(data.decode("utf-8"), object_hook=lambda d: SimpleNamespace(**d))
-        if hasattr(x, 'settings'):
-            return effectById(x.effect, x.settings)
-        else:
-            return effectById(x.effect, None)
+        return self.metrics.decode("GET", "/effect", parseEffect, self._get("/effect"))
 
     def setEffect(self, effecte):
         """
         @param effecte: Effect
         @return: boolean
         """
-
-        conn = http.client.HTTPConnection(self.ip)
-        payload = json.dumps(effecte, cls=EffectEncoder)
-        _LOGGER.debug("Payload: " + str(payload))
-        print(payload)
-        headers = {
-            'Content-Type': 'application/json'
-        }
-        conn.request("POST", "/effect", payload, headers)
-        res = conn.getresponse()
-        if res.getcode() == http.HTTPStatus.OK:
-            return True
-        else:
-            data = res.read()
-            _LOGGER.error("Set effect returned an error: %s", data.decode("utf-8"))
-            return False
-
-    @staticmethod
-    def getEffectList():
-        return effect.effects
-
-    @staticmethod
-    def getEffectIdByName(name):
-        return effect.effectIdByName(name)
-
-    @staticmethod
-    def getEffectByName(name, settings):
-        return effect.effectByName(name, settings)
+        payload = self.metrics.encode("POST", "/effect", json.dumps, effecte, cls=EffectEncoder)
+        _LOGGER.debug("Payload: %s", payload)
+        return self._post("/effect", payload, "Set effect")
 
     @staticmethod
     def validateConnection(ip):
         """Attempts to connect to the device to verify the given host"""
+        conn = http.client.HTTPConnection(ip, timeout=CONNECT_TIMEOUT)
         try:
-            conn = http.client.HTTPConnection(ip)
-            payload = ''
-            headers = {}
-            conn.request("GET", "/power", payload, headers)
+            conn.request("GET", "/power")
             res = conn.getresponse()
             if res.getcode() != http.HTTPStatus.OK:
                 raise ColorWallConnectionError
         except OSError as err:
             raise ColorWallConnectionError from err
+        finally:
+            conn.close()
 
+    @profiled("API.update")
     def update(self):
         try:
             x = self.getPower()
             self.powered = x.power
             self.brightness = x.brightness
-            self.panels = self.getPanels()
+            self.getPanels()
             self.currentEffect = self.getEffect()
         except OSError as err:
             raise ColorWallConnectionError from err
 
 
+class AsyncAPI(BaseAPI):
+    """Asyncio client for a wall
+
+    All requests go through the given aiohttp session, which keeps a pool of
+    keep-alive connections per host, so polls and commands run on the event loop
+    without a thread hop or a new TCP handshake."""
+
+    def __init__(self, ip, session: aiohttp.ClientSession, freshness=None, write_window=DEFAULT_WRITE_WINDOW,
+                 limiter=None):
+        """
+        @param limiter: RefreshScheduler whose slots the requests wait for, None to send them right away
+        """
+        super().__init__(ip)
+        self._session = session
+        self.limiter = limiter
+        self._url = f"http://{ip}"
+        self._timeout = aiohttp.ClientTimeout(total=None, connect=CONNECT_TIMEOUT, sock_read=READ_TIMEOUT)
+        self.breaker = circuitBreaker(ip)
+        self.freshness = dict(DEFAULT_FRESHNESS)
+        if freshness is not None:
+            self.freshness.update(freshness)
+        self._fetched = {}
+        self.commands = CommandQueue(COMMAND_PRIORITIES)
+        self.writeWindow = write_window
+        self._seq = 0  # numbers every write, so a read can tell whether a write started after it
+        self._written = {POWER: 0, PANELS: 0, EFFECT: 0}
+        self._inflight = {POWER: 0, PANELS: 0, EFFECT: 0}
+        self._sendingPanels = 0
+        self._confirmed = {POWER: None, EFFECT: None}  # the state the device last confirmed
+        self.writeStats = {endpoint: {"sent": 0, "skipped": 0} for endpoint in (POWER, PANELS, EFFECT)}
+        self.onChange = None  # called whenever a command changed the cached state
+        self._acked = None  # snapshot of the panels last acknowledged by the device
+        self.partialPanels = None  # whether the device accepts PATCH /panels, None until we know
+
+    async def _async_attempt(self, call):
+        """Runs a refresh or a command as a single call on the circuit breaker of the host
+        @param call: coroutine function sending the requests of the refresh or command
+        """
+        if not self.breaker.allow():
+            raise ColorWallConnectionError(f"{self.ip} is unreachable, not trying again yet")
+        try:
+            result = await call()
+        except ColorWallConnectionError:
+            self.breaker.failed()
+            raise
+        except BaseException:
+            self.breaker.abandoned()
+            raise
+        self.breaker.succeeded()
+        return result
+
+    async def _async_request(self, method, path, payload=None):
+        """Sends a single request and returns the status and body of the response"""
+        if self.limiter is None:
+            return await self._async_send(method, path, payload)
+        async with self.limiter.slot(self.ip):
+            return await self._async_send(method, path, payload)
+
+    async def _async_send(self, method, path, payload):
+        headers = JSON_HEADERS if payload is not None else None
+        metrics = self.metrics.endpoint(method, path)
+        metrics.requests += 1
+        metrics.bytesSent += len(payload) if payload is not None else 0
+        started = time.perf_counter()
+        try:
+            async with self._session.request(method, self._url + path, data=payload, headers=headers,
+                                             timeout=self._timeout) as res:
+                result = res.status, await res.read()
+        except (aiohttp.ClientError, asyncio.TimeoutError) as err:
+            if isinstance(err, asyncio.TimeoutError):
+                metrics.timeouts += 1
+            else:
+                metrics.errors += 1
+            raise ColorWallConnectionError from err
+        metrics.observe(time.perf_counter() - started)
+        metrics.bytesReceived += len(result[1])
+        if result[0] != http.HTTPStatus.OK:
+            metrics.errors += 1
+        return result
+
+    async def _async_get(self, path):
+        status, data = await self._async_request("GET", path)
+        if status != http.HTTPStatus.OK:
+            raise ColorWallConnectionError(f"GET {path} returned {status}")
+        return data
+
+    async def _async_post(self, path, payload, what):
+        status, data = await self._async_request("POST", path, payload)
+        if status == http.HTTPStatus.OK:
+            return True
+        else:
+            _LOGGER.error("%s returned an error: %s", what, data.decode("utf-8"))
+            return False
+
+    async def _async_write(self, endpoint, send, value=None, delay=0.0, cached=True):
+        """Queues a write whose new state is already in the cache
+           Reads that overlap the write are not applied, so they cannot bring back the old state,
+           and a failed write makes the endpoint due to be read again
+           When a value is given the write is skipped if the device already confirmed it, the cache
+           then holds what it held before
+           A write still queued when a newer one to the endpoint arrives goes out with the newer one
+           Uncached writes, the frames of a stream and the steps of a fade, leave the cache and its
+           listeners alone"""
+        if value is not None:
+            if not self._inflight[endpoint] and self._confirmed[endpoint] == value:
+                self.writeStats[endpoint]["skipped"] += 1
+                return True
+            self.writeStats[endpoint]["sent"] += 1
+        if cached:
+            self.changed()
+
+        self._seq += 1
+        seq = self._written[endpoint] = self._seq
+        self._inflight[endpoint] += 1
+        ok = False
+        try:
+            ok = await self.commands.async_submit(endpoint, lambda: self._async_attempt(send), delay)
+        finally:
+            self._inflight[endpoint] -= 1
+            if not ok:
+                self._fetched.pop(endpoint, None)
+        # Only the newest write knows the state the device confirmed
+        if ok and value is not None and self._written[endpoint] == seq:
+            self._confirmed[endpoint] = value
+        return ok
+
+    def changed(self):
+        """Tells the listeners that a command changed the cached state"""
+        if self.onChange is not None:
+            self.onChange()
+
+    def beginWrite(self, endpoint):
+        """Marks a write spanning several requests, such as a transition or a stream, as in flight
+           Reads and pushes of the endpoint meanwhile are not applied and the requests are never skipped
+           Every call has to be ended by endWrite"""
+        self._seq += 1
+        self._written[endpoint] = self._seq
+        self._inflight[endpoint] += 1
+
+    def endWrite(self, endpoint):
+        self._inflight[endpoint] -= 1
+
+    @contextlib.contextmanager
+    def writing(self, endpoint):
+        """Marks the write of a block as in flight, see beginWrite"""
+        self.beginWrite(endpoint)
+        try:
+            yield
+        finally:
+            self.endWrite(endpoint)
+
+    async def async_send_frame(self, payload):
+        """Sends a /panels body without caching it, for the frames of a stream
+           Queued like any panel write, it replaces a panel write still waiting to be sent"""
+        return await self._async_write(PANELS, lambda: self._async_post("/panels", payload, "Set frame"),
+                                       cached=False)
+
+    async def async_send_power(self, powered, brightness):
+        """Sends the power without caching it, for the intermediate steps of a fade"""
+        payload = self.metrics.encode("POST", "/power", json.dumps, {"power": powered, "brightness": brightness})
+        return await self._async_write(POWER, lambda: self._async_post("/power", payload, "Set power"),
+                                       cached=False)
+
+    async def async_set_power(self, powered, brightness):
+        state = {
+            "power": powered,
+            "brightness": brightness
+        }
+        payload = self.metrics.encode("POST", "/power", json.dumps, state)
+        _LOGGER.debug("Set power: %s", payload)
+        self.powered = powered
+        self.brightness = brightness
+        return await self._async_write(POWER, lambda: self._async_post("/power", payload, "Set power"),
+                                       (powered, brightness))
+
+    async def async_get_power(self):
+        return self.metrics.decode("GET", "/power", parsePower, await self._async_get("/power"))
+
+    async def async_get_panels(self):
+        return self.metrics.decode("GET", "/panels", parsePanels, await self._async_get("/panels"))
+
+    async def async_set_panels(self, panels, cached=True):
+        """Sends the panels that changed since the device last acknowledged the wall
+           Falls back to the full payload when the device does not accept partial updates
+           Panels other than the cached ones, like the frames of a fade, are sent with cached False
+
+        @type panels: PanelStore
+        """
+        return await self._async_write(PANELS, lambda: self._async_send_panels(panels), cached=cached)
+
+    @profiled("AsyncAPI.send_panels")
+    async def _async_send_panels(self, panels):
+        """Skips the request when every panel is as the device acknowledged it"""
+        state = panels.snapshot()
+        changed = panels.changed(self._acked)
+        if not changed and not self._sendingPanels:
+            self.writeStats[PANELS]["skipped"] += 1
+            return True
+        self.writeStats[PANELS]["sent"] += 1
+
+        self._sendingPanels += 1
+        try:
+            return await self._async_post_panels(panels, state, changed)
+        finally:
+            self._sendingPanels -= 1
+
+    async def _async_post_panels(self, panels, state, changed):
+        """Posts the changed panels, or all of them when that is not possible
+           The full wall is only sent while we do not know yet whether the device accepts partial
+           updates, or once it answered that it does not"""
+        if changed and len(changed) < len(panels) and self.partialPanels is not False:
+            payload = self.metrics.encode("PATCH", "/panels", self.panelEncoder.encode, panels, changed, state)
+            if _LOGGER.isEnabledFor(logging.DEBUG):
+                _LOGGER.debug("Set changed panels: %s", payload.decode("utf-8"))
+            status, data = await self._async_request("PATCH", "/panels", payload)
+            if status == http.HTTPStatus.OK:
+                self.partialPanels = True
+                self._acked = state
+                return True
+            if status in PATCH_UNSUPPORTED:
+                _LOGGER.info("%s does not accept partial panel updates, sending the full wall", self.ip)
+                self.partialPanels = False
+            elif self.partialPanels:
+                # Any other error is the device failing, not the method, and the full wall would only
+                # add to its trouble
+                _LOGGER.error("Set changed panels returned an error: %s", data.decode("utf-8"))
+                return False
+
+        payload = self.metrics.encode("POST", "/panels", self.panelEncoder.encode, panels, snapshot=state)
+        if _LOGGER.isEnabledFor(logging.DEBUG):
+            _LOGGER.debug("Set panels: %s", payload.decode("utf-8"))
+        if await self._async_post("/panels", payload, "Set panels"):
+            self._acked = state
+            return True
+        return False
+
+    async def async_queue_panels(self):
+        """Sends the panels once the current write window closes
+           Panel changes made by other callers within the window go out in the same request"""
+        return await self._async_write(PANELS, lambda: self._async_send_panels(self.panels), delay=self.writeWindow)
+
+    async def async_get_effect(self):
+        return self.metrics.decode("GET", "/effect", parseEffect, await self._async_get("/effect"))
+
+    async def async_set_effect(self, effecte):
+        """
+        @param effecte: Effect
+        @return: boolean
+        """
+        payload = self.metrics.encode("POST", "/effect", encodeEffect, effecte)
+        _LOGGER.debug("Payload: %s", payload)
+        self.currentEffect = effecte
+        return await self._async_write(EFFECT, lambda: self._async_post("/effect", payload, "Set effect"), payload)
+
+    async def async_set_configured_effect(self, eId):
+        """Switches to an effect with the settings from the options, using its cached payload
+        @return: boolean
+        """
+        self.currentEffect = self.effectSettings[eId]
+        payload = self.effectPayloads[eId]
+        return await self._async_write(EFFECT, lambda: self._async_post("/effect", payload, "Set effect"), payload)
+
+    def applyPush(self, data):
+        """Applies a state change the device pushed, any of power, brightness, effect and panels
+           Changes to an endpoint with a write in flight are ignored, the write is newer"""
+        if "power" in data or "brightness" in data:
+            if not self._inflight[POWER]:
+                self.powered = data.get("power", self.powered)
+                self.brightness = data.get("brightness", self.brightness)
+                self._confirmed[POWER] = (self.powered, self.brightness)
+        if data.get("effect") is not None and not self._inflight[EFFECT]:
+            pushed = data["effect"]
+            self.currentEffect = effectById(pushed["effect"], effect.Settings(pushed.get("settings", {})))
+            self._confirmed[EFFECT] = encodeEffect(self.currentEffect)
+        if data.get("panels") and not self._inflight[PANELS]:
+            updated = self.panels.apply(data["panels"])
+            if self._acked is not None:
+                acked = [bytearray(channel) for channel in self._acked]
+                for i in updated:
+                    acked[0][i] = self.panels.hue[i]
+                    acked[1][i] = self.panels.saturation[i]
+                    acked[2][i] = self.panels.brightness[i]
+                self._acked = tuple(bytes(channel) for channel in acked)
+
+    @staticmethod
+    async def async_validate_connection(session: aiohttp.ClientSession, ip):
+        """Attempts to connect to the device to verify the given host
+           Goes around the circuit breaker so the user can retry right away"""
+        timeout = aiohttp.ClientTimeout(total=None, connect=CONNECT_TIMEOUT, sock_read=READ_TIMEOUT)
+        try:
+            async with session.get(f"http://{ip}/power", timeout=timeout) as res:
+                if res.status != http.HTTPStatus.OK:
+                    raise ColorWallConnectionError
+        except (aiohttp.ClientError, asyncio.TimeoutError) as err:
+            raise ColorWallConnectionError from err
+
+    def _due(self, force):
+        """Returns the endpoints whose data is older than their freshness allows"""
+        now = time.monotonic()
+        return [
+            endpoint for endpoint, maxAge in self.freshness.items()
+            if force or endpoint not in self._fetched or now - self._fetched[endpoint] >= maxAge
+        ]
+
+    @profiled("AsyncAPI.async_update")
+    async def async_update(self, force=False):
+        """Refreshes the state of the wall
+           The reads that are due are issued concurrently and only applied once all of them
+           succeeded, so the state is always one consistent snapshot
+           A read is dropped if a write to its endpoint was in flight or started meanwhile,
+           the cache already holds the newer state and the next refresh confirms it"""
+        readers = {
+            POWER: self.async_get_power,
+            PANELS: self.async_get_panels,
+            EFFECT: self.async_get_effect,
+        }
+        due = self._due(force)
+        started = time.monotonic()
+        startedSeq = self._seq
+        busy = {endpoint for endpoint, count in self._inflight.items() if count}
+        results = dict(zip(due, await self._async_attempt(
+            lambda: asyncio.gather(*[readers[endpoint]() for endpoint in due])
+        )))
+        for endpoint in due:
+            if endpoint in busy or self._written[endpoint] > startedSeq or self._inflight[endpoint]:
+                del results[endpoint]
+
+        # The panels first, nothing is applied when the device sent panels the store cannot hold
+        if PANELS in results:
+            try:
+                self.panels.load(results[PANELS])
+            except ValueError as err:
+                raise ColorWallConnectionError(f"{self.ip} sent invalid panels: {err}") from err
+            self._acked = self.panels.snapshot()
+        if POWER in results:
+            self.powered = results[POWER].power
+            self.brightness = results[POWER].brightness
+            self._confirmed[POWER] = (self.powered, self.brightness)
+        if EFFECT in results:
+            self.currentEffect = results[EFFECT]
+            self._confirmed[EFFECT] = encodeEffect(self.currentEffect)
+        for endpoint in results:
+            self._fetched[endpoint] = started
+
+
 class ColorWallConnectionError(Exception):
     pass
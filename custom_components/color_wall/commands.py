@@ -0,0 +1,134 @@
+"""Sends the commands of a wall one at a time, the most urgent first
+
+The wall is a single threaded microcontroller, concurrent POSTs can make it run out of memory.
+Every command of a wall goes through its CommandQueue, whose single worker sends them in order of
+priority: power before effect before panels, so turning the wall off is not stuck behind a repaint.
+
+Commands are queued by target. A command for a target that already has one waiting supersedes it,
+the cache already holds the newer state, so both callers wait on the one request that sends it.
+A scene touching 40 panels calls turn_on on 40 entities at once; their panel commands wait out a
+short write window and collapse into a single /panels request.
+"""
+import asyncio
+import time
+
+# Seconds to wait for further panel changes before the queued ones are sent
+DEFAULT_WRITE_WINDOW = 0.05
+
+
+class Command:
+    __slots__ = ("send", "future", "queuedAt", "readyAt")
+
+    def __init__(self, send, future, queuedAt, readyAt):
+        self.send = send
+        self.future = future
+        self.queuedAt = queuedAt
+        self.readyAt = readyAt
+
+
+class CommandQueue:
+    """A priority queue of the commands of one wall with a single worker sending them"""
+
+    def __init__(self, priorities):
+        """
+        @param priorities: dict of target to priority, lower is sent first
+        """
+        self._priorities = priorities
+        self._pending = {}
+        self._wake = asyncio.Event()
+        self._worker = None
+        self._current = None
+        self.inFlight = None
+        self.stats = {
+            "sent": 0,
+            "collapsed": 0,
+            "maxDepth": 0,
+            "wait": {target: {"count": 0, "total": 0.0, "max": 0.0} for target in priorities},
+        }
+
+    @property
+    def depth(self):
+        """Commands waiting to be sent, not counting the one in flight"""
+        return len(self._pending)
+
+    async def async_submit(self, target, send, delay=0.0):
+        """Queues a command and waits for the request that carries it
+        @param send: coroutine function sending the command, returns its result
+        @param delay: seconds to wait for commands superseding this one before it may be sent
+        """
+        loop = asyncio.get_running_loop()
+        now = time.monotonic()
+        command = self._pending.get(target)
+        if command is not None:
+            command.send = send
+            self.stats["collapsed"] += 1
+        else:
+            command = self._pending[target] = Command(send, loop.create_future(), now, now + delay)
+            self.stats["maxDepth"] = max(self.stats["maxDepth"], len(self._pending))
+        self._wake.set()
+        if self._worker is None or self._worker.done():
+            self._worker = asyncio.ensure_future(self._async_work())
+        # Shielded, a caller giving up must not cancel the request other callers wait on
+        return await asyncio.shield(command.future)
+
+    def _next(self):
+        """The most urgent command that may be sent now, or the seconds until one may be"""
+        now = time.monotonic()
+        ready = [target for target, command in self._pending.items() if command.readyAt <= now]
+        if not ready:
+            return None, min(command.readyAt for command in self._pending.values()) - now
+        return min(ready, key=self._priorities.__getitem__), 0.0
+
+    async def _async_work(self):
+        while self._pending:
+            target, wait = self._next()
+            if target is None:
+                self._wake.clear()
+                try:
+                    await asyncio.wait_for(self._wake.wait(), wait)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            command = self._pending.pop(target)
+            waited = time.monotonic() - command.queuedAt
+            stats = self.stats["wait"][target]
+            stats["count"] += 1
+            stats["total"] += waited
+            stats["max"] = max(stats["max"], waited)
+
+            self.inFlight, self._current = target, command
+            try:
+                result = await command.send()
+            except Exception as err:  # handed to the callers, the worker carries on
+                command.future.set_exception(err)
+            else:
+                command.future.set_result(result)
+            finally:
+                self.inFlight, self._current = None, None
+            self.stats["sent"] += 1
+
+    def cancel(self):
+        """Drops the waiting commands and stops the worker, their callers get CancelledError"""
+        for command in [*self._pending.values(), self._current]:
+            if command is not None:
+                command.future.cancel()
+        self._pending.clear()
+        if self._worker is not None:
+            self._worker.cancel()
+
+    def asDict(self):
+        return {
+            "depth": self.depth,
+            "in_flight": self.inFlight,
+            "sent": self.stats["sent"],
+            "collapsed": self.stats["collapsed"],
+            "max_depth": self.stats["maxDepth"],
+            "wait": {
+                target: {
+                    "count": wait["count"],
+                    "mean": wait["total"] / wait["count"] if wait["count"] else None,
+                    "max": wait["max"],
+                } for target, wait in self.stats["wait"].items()
+            },
+        }
@@ -3,10 +3,11 @@ from homeassistant import config_entries
 import voluptuous as vol
 from homeassistant.config_entries import ConfigEntry
 from homeassistant.core import callback
+from homeassistant.helpers.aiohttp_client import async_get_clientsession
 
 from . import DOMAIN, fixDict
 from . import effect
-from .api import API, ColorWallConnectionError
+from .api import AsyncAPI, ColorWallConnectionError
 
 EFFECT_TO_CONFIGURE = "effect_to_configure"
 CONFIG_ALL = "Configure all effects"
@@ -23,8 +24,8 @@ class ColorWallConfigFlow(config_entries.ConfigFlow):
         errors = {}
         if user_input is not None:
             try:
-                await self.hass.async_add_executor_job(
-                    API.validateConnection,
+                await AsyncAPI.async_validate_connection(
+                    async_get_clientsession(self.hass),
                     user_input["host"]
                 )
             except ColorWallConnectionError:
@@ -0,0 +1,210 @@
+"""Coordinates polling of a single ColorWall so all of its entities share one refresh"""
+import logging
+import random
+import time
+from datetime import timedelta
+
+from homeassistant.core import HomeAssistant, callback
+from homeassistant.helpers.storage import Store
+from homeassistant.helpers.update_coordinator import DataUpdateCoordinator, UpdateFailed
+
+from .api import AsyncAPI, ColorWallConnectionError
+from .profiling import profiled
+from .scheduler import RefreshScheduler
+
+_LOGGER = logging.getLogger(__name__)
+
+SCAN_INTERVAL = timedelta(seconds=30)
+# Poll quickly for a while after a command to confirm the new state
+CONFIRM_INTERVAL = timedelta(seconds=2)
+CONFIRM_PERIOD = 10
+# Poll slowly once this many polls in a row found nothing changed
+IDLE_INTERVAL = timedelta(minutes=2)
+IDLE_AFTER = 5
+# Longest wait between polls of a wall that keeps failing
+MAX_BACKOFF = timedelta(minutes=5)
+# Fallback poll of a wall that pushes its changes, in case the push channel breaks
+PUSH_FALLBACK_INTERVAL = timedelta(minutes=15)
+# Seconds after a change of the wall before the last known state is written to disk, changes
+# meanwhile are written with it instead of putting the write off
+SAVE_DELAY = 30
+
+
+class PollSchedule:
+    """Picks the interval until the next poll of a wall
+
+    - Fast for a short period after a command, to confirm the state it set
+    - The scan interval while the wall is changing
+    - Slower once nothing changed for a few polls
+    - Only as a slow fallback once the wall pushes its changes
+    - Backing off exponentially, with jitter, while the wall cannot be reached
+
+    The first regular interval is longer by the phase, which moves the cycle of the wall away from
+    the cycles of the other walls."""
+
+    def __init__(self, phase=timedelta(0)):
+        self.failures = 0
+        self.unchanged = 0
+        self.confirmUntil = 0.0
+        self.pushing = False
+        self.phase = phase
+
+    def commanded(self):
+        self.confirmUntil = time.monotonic() + CONFIRM_PERIOD
+        self.unchanged = 0
+
+    def pushed(self):
+        self.pushing = True
+        self.failures = 0
+
+    def succeeded(self, changed):
+        self.failures = 0
+        self.unchanged = 0 if changed else self.unchanged + 1
+        if changed and self.pushing and time.monotonic() >= self.confirmUntil:
+            # The poll found a change that was never pushed, the push channel cannot be trusted
+            _LOGGER.info("A poll found changes the wall did not push, polling regularly again")
+            self.pushing = False
+
+    def failed(self):
+        self.failures += 1
+
+    def interval(self) -> timedelta:
+        if self.failures:
+            backoff = min(MAX_BACKOFF, SCAN_INTERVAL * 2 ** min(self.failures - 1, 10))
+            return backoff * random.uniform(0.5, 1.0)
+        if time.monotonic() < self.confirmUntil:
+            return CONFIRM_INTERVAL
+        if self.pushing:
+            interval = PUSH_FALLBACK_INTERVAL
+        elif self.unchanged >= IDLE_AFTER:
+            interval = IDLE_INTERVAL
+        else:
+            interval = SCAN_INTERVAL
+        if self.phase:
+            interval, self.phase = interval + self.phase, timedelta(0)
+        return interval
+
+
+class ColorWallCoordinator(DataUpdateCoordinator):
+    """Owns the poll cycle of one wall and fans the result out to the main and panel entities"""
+
+    def __init__(self, hass: HomeAssistant, controller: AsyncAPI, store: Store, scheduler: RefreshScheduler = None):
+        super().__init__(
+            hass,
+            _LOGGER,
+            name=f"ColorWall {controller.ip}",
+            update_interval=SCAN_INTERVAL,
+        )
+        self.controller = controller
+        self.controller.onChange = self.async_update_listeners
+        self._scheduler = scheduler
+        self.schedule = PollSchedule(scheduler.register(controller.ip, SCAN_INTERVAL) if scheduler else timedelta(0))
+        self._store = store
+        self._saved = None  # what the entities showed of the state last written to disk
+        self._saveScheduled = False
+        self._published = None
+        self.mainChanged = True
+        self.changedPanels = None  # indexes of the panels that changed in the last update, None for all
+
+    async def async_restore(self):
+        """Fills the cache with the state stored at the last run, returns whether there was one"""
+        state = await self._store.async_load()
+        if state is None:
+            return False
+        try:
+            self.controller.restoreState(state)
+        except (KeyError, TypeError, ValueError) as err:
+            _LOGGER.warning("Ignoring the stored state of %s: %s", self.controller.ip, err)
+            return False
+        self._saved = self._state()
+        return True
+
+    def _dumpForSave(self):
+        """The state to write to disk, called by the store when it writes"""
+        self._saveScheduled = False
+        self._saved = self._state()
+        return self.controller.dumpState()
+
+    @callback
+    def _async_schedule_save(self):
+        """Writes the state to disk SAVE_DELAY seconds after the first change since the last write
+           The store puts off a delayed write on every call, so it is only called once per write"""
+        if not self._saveScheduled:
+            self._saveScheduled = True
+            self._store.async_delay_save(self._dumpForSave, SAVE_DELAY)
+
+    async def async_save(self):
+        """Writes the state to disk right away, such as before the entry reloads"""
+        await self._store.async_save(self._dumpForSave())
+
+    def _state(self):
+        """What the entities show of the wall, to tell whether a poll changed anything"""
+        c = self.controller
+        return c.powered, c.brightness, c.currentEffect and c.currentEffect.effect, c.panels.snapshot()
+
+    def panelChanged(self, index):
+        """Whether the last update changed what the panel entity at the index shows"""
+        return self.changedPanels is None or index in self.changedPanels
+
+    @callback
+    def async_add_listener(self, update_callback, context=None):
+        # Entities write their state when they are added, which is what the first one is shown
+        if self._published is None:
+            self._published = self._state()
+        return super().async_add_listener(update_callback, context)
+
+    @callback
+    @profiled("entity state writes")
+    def async_update_listeners(self):
+        """Works out what changed since the entities were last told, then tells them
+           Entities only write their state when the part of the wall they show changed"""
+        state = self._state()
+        if self._published is None:
+            self.mainChanged = True
+            self.changedPanels = None
+        else:
+            powered, snapshot = self._published[0], self._published[3]
+            self.mainChanged = state[:3] != self._published[:3]
+            if state[0] != powered or len(state[3][0]) != len(snapshot[0]):
+                # Whether a panel is on depends on the power of the wall
+                self.changedPanels = None
+            else:
+                self.changedPanels = set(self.controller.panels.changed(snapshot))
+        self._published = state
+        if state != self._saved:
+            self._async_schedule_save()
+        super().async_update_listeners()
+
+    @profiled("coordinator refresh")
+    async def _async_update_data(self):
+        """Fetch the wall state once per cycle, no matter how many panels it has"""
+        before = self._state()
+        started = time.monotonic()
+        try:
+            await self.controller.async_update()
+        except ColorWallConnectionError as err:
+            self.schedule.failed()
+            self.update_interval = self.schedule.interval()
+            raise UpdateFailed(f"Cannot connect to host {self.controller.ip}") from err
+
+        if self._scheduler is not None:
+            self._scheduler.polled(time.monotonic() - started)
+        self.schedule.succeeded(self._state() != before)
+        self.update_interval = self.schedule.interval()
+        return self.controller
+
+    @callback
+    def async_push(self, data):
+        """Applies a state change pushed by the wall and tells the entities about it"""
+        self.controller.applyPush(data)
+        self.schedule.pushed()
+        self.update_interval = self.schedule.interval()
+        self.async_set_updated_data(self.controller)
+
+    @callback
+    def async_commanded(self):
+        """Called after a command was sent, confirms it with a read in the background
+           and keeps polling quickly for a while"""
+        self.schedule.commanded()
+        self.update_interval = self.schedule.interval()
+        self.hass.async_create_task(self.async_request_refresh())
@@ -0,0 +1,43 @@
+"""Diagnostics of a wall: its request metrics, breaker, poll schedule and write counters"""
+from homeassistant.components.diagnostics import async_redact_data
+from homeassistant.config_entries import ConfigEntry
+from homeassistant.core import HomeAssistant
+
+from . import DOMAIN, CONTROLLER, COORDINATOR, SCHEDULER, STREAM, TRANSITIONS
+from .push import CONF_WEBHOOK_ID
+
+TO_REDACT = {CONF_WEBHOOK_ID}
+
+
+async def async_get_config_entry_diagnostics(hass: HomeAssistant, entry: ConfigEntry) -> dict:
+    data = hass.data[DOMAIN][entry.entry_id]
+    controller = data[CONTROLLER]
+    coordinator = data[COORDINATOR]
+    stream = data[STREAM]
+    breaker = controller.breaker
+    return {
+        "entry": async_redact_data(entry.as_dict(), TO_REDACT),
+        "wall": {
+            "panels": len(controller.panels),
+            "partial_panels": controller.partialPanels,
+            "writes": controller.writeStats,
+        },
+        "breaker": {
+            "state": breaker.state,
+            "failures": breaker.failures,
+            "trips": breaker.trips,
+            "short_circuited": breaker.shortCircuited,
+        },
+        "poll": {
+            "interval": coordinator.update_interval.total_seconds(),
+            "last_update_success": coordinator.last_update_success,
+            "failures": coordinator.schedule.failures,
+            "pushing": coordinator.schedule.pushing,
+        },
+        "endpoints": controller.metrics.asDict(),
+        "commands": controller.commands.asDict(),
+        # Shared by all walls
+        "scheduler": hass.data[DOMAIN][SCHEDULER].asDict(),
+        "transitions": dict(data[TRANSITIONS].stats),
+        "stream": {**stream.stats, "active": stream.active, "fps": stream.fps},
+    }
@@ -1,8 +1,13 @@
 # Effect class represents an effect
 import json
+import logging
 from json import JSONEncoder
 import voluptuous as vol
 
+from .profiling import profiled
+
+_LOGGER = logging.getLogger(__name__)
+
 
 class Settings(object):
     def __init__(self, settings):
@@ -44,38 +49,68 @@ class Effect:
 
         return val
 
+    @classmethod
+    def fromSettings(cls, settings):
+        """Creates the effect from an object holding its settings as attributes
+           Settings that are missing take the default of the schema"""
+        return cls(**{
+            str(key.schema): getattr(settings, str(key.schema), key.default()) for key in cls.settingKeys
+        })
+
+
+class EffectRegistry:
+    """Lookup tables of all known effects, built once as the effect classes are registered
+       Adding an effect only takes defining its class with the @register decorator"""
+
+    def __init__(self):
+        self.byId = {}
+        self.byName = {}
+        self.idByName = {}
+        self.schemas = {}
+
+    def register(self, cls):
+        self.byId[cls.eId] = cls
+        self.byName[cls.name] = cls
+        self.idByName[cls.name] = cls.eId
+        self.schemas[cls.eId] = vol.Schema(cls.settings_schema)
+        cls.settingKeys = [key for key in cls.settings_schema if str(key.schema) != "type"]
+        return cls
+
+
+registry = EffectRegistry()
+register = registry.register
+
 
 def effectById(effectId, settings):
-    return {
-        0: lambda sett: Smooth(sett.speed, sett.width),
-        1: lambda sett: Bpm(sett.bpm, sett.style),
-        2: lambda sett: Solid(),
-        3: lambda sett: Colory(sett.speed),
-        4: lambda sett: Wash(sett.speed, sett.baseHue, sett.deltaHue),
-        5: lambda sett: Rainbow(sett.speed, sett.direction)
-    }[effectId](settings)
+    return registry.byId[effectId].fromSettings(settings)
 
 
 def effectByName(effectName, settings):
-    return {
-        Smooth.name: lambda sett: Smooth(sett.speed, sett.width),
-        Bpm.name: lambda sett: Bpm(sett.bpm, sett.style),
-        Solid.name: lambda sett: Solid(),
-        Colory.name: lambda sett: Colory(sett.speed),
-        Wash.name: lambda sett: Wash(sett.speed, sett.baseHue, sett.deltaHue),
-        Rainbow.name: lambda sett: Rainbow(sett.speed, sett.direction)
-    }[effectName](settings)
+    return registry.byName[effectName].fromSettings(settings)
 
 
 def effectIdByName(effectName):
-    return {
-        Smooth.name: Smooth.eId,
-        Bpm.name: Bpm.eId,
-        Solid.name: Solid.eId,
-        Colory.name: Colory.eId,
-        Wash.name: Wash.eId,
-        Rainbow.name: Rainbow.eId
-    }[effectName]
+    return registry.idByName[effectName]
+
+
+@profiled("configuredEffects")
+def configuredEffects(options):
+    """Validates the configured settings of every effect against its schema
+       Returns the effects by id, an effect whose settings do not validate gets the defaults
+
+    @param options: dict of effect id to settings, as stored by the options flow
+    """
+    configured = {}
+    for eId, cls in registry.byId.items():
+        schema = registry.schemas[eId]
+        try:
+            settings = schema(options.get(eId, {}))
+        except vol.Invalid as err:
+            _LOGGER.warning("Invalid settings for effect %s, using the defaults: %s", cls.name, err)
+            settings = schema({})
+        configured[eId] = cls.fromSettings(Settings(settings))
+
+    return configured
 
 
 class EffectEncoder(JSONEncoder):
@@ -86,6 +121,12 @@ class EffectEncoder(JSONEncoder):
             return json.JSONEncoder.default(self, o)
 
 
+def encodeEffect(effecte):
+    """Returns the body of a /effect request for the effect"""
+    return json.dumps(effecte, cls=EffectEncoder).encode("utf-8")
+
+
+@register
 class Smooth(Effect):
     eId = 0
     name = "Smooth line of light"
@@ -101,6 +142,7 @@ class Smooth(Effect):
         self.settings.width = width
 
 
+@register
 class Bpm(Effect):
     eId = 1
     name = "Pulses of light"
@@ -116,6 +158,7 @@ class Bpm(Effect):
         self.settings.style = style
 
 
+@register
 class Solid(Effect):
     eId = 2
     name = "Solid light"
@@ -126,6 +169,7 @@ class Solid(Effect):
         super().__init__(Solid.eId, Solid.name, Solid.settings_schema)
 
 
+@register
 class Colory(Effect):
     eId = 3
     name = "Animated tile colors"
@@ -139,6 +183,7 @@ class Colory(Effect):
         self.settings.speed = speed
 
 
+@register
 class Wash(Effect):
     eId = 4
     name = "Color wash"
@@ -156,6 +201,7 @@ class Wash(Effect):
         self.settings.deltaHue = deltaHue
 
 
+@register
 class Rainbow(Effect):
     eId = 5
     name = "Animated rainbow"
@@ -171,21 +217,6 @@ class Rainbow(Effect):
         self.settings.direction = direction
 
 
-effects = [
-    Smooth.name,
-    Bpm.name,
-    Solid.name,
-    Colory.name,
-    Wash.name,
-    Rainbow.name
-]
-
-data_schema = [
-    Smooth.settings_schema,
-    Bpm.settings_schema,
-    Solid.settings_schema,
-    Colory.settings_schema,
-    Wash.settings_schema,
-    Rainbow.settings_schema,
-]
+effects = [registry.byId[eId].name for eId in sorted(registry.byId)]
 
+data_schema = [registry.byId[eId].settings_schema for eId in sorted(registry.byId)]
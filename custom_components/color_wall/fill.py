@@ -0,0 +1,86 @@
+"""Computes fills for every panel of a wall in one vectorized pass
+
+A fill maps the panels, in the order of the wall, onto a list of colors given in Home Assistant's
+ranges (hue 0-360, saturation 0-100). The result is converted to the 0-255 ranges of the device and
+written straight into the arrays of the PanelStore, ready to be sent as one /panels request.
+"""
+import numpy as np
+
+PALETTE = "palette"
+GRADIENT = "gradient"
+NOISE = "noise"
+
+
+def toBytes(values, scale):
+    """Converts values in 0-scale to the 0-255 range of the device, what remap does per panel"""
+    return np.clip(np.rint(values * (255.0 / scale)), 0, 255).astype(np.uint8)
+
+
+def colorsAt(colors, t):
+    """Interpolates hue and saturation along the colors at the positions t in 0-1
+       Hue takes the short way around the color wheel between two colors"""
+    colors = np.asarray(colors, dtype=np.float64).reshape(-1, 2)
+    if len(colors) == 1:
+        return np.full(len(t), colors[0, 0]), np.full(len(t), colors[0, 1])
+    stops = np.linspace(0.0, 1.0, len(colors))
+    hues = np.rad2deg(np.unwrap(np.deg2rad(colors[:, 0])))
+    hue = np.mod(np.interp(t, stops, hues), 360.0)
+    saturation = np.interp(t, stops, colors[:, 1])
+    return hue, saturation
+
+
+def palette(colors, count, **kwargs):
+    """Repeats the colors across the panels"""
+    colors = np.asarray(colors, dtype=np.float64).reshape(-1, 2)
+    picked = colors[np.arange(count) % len(colors)]
+    return picked[:, 0], picked[:, 1]
+
+
+def gradient(colors, count, **kwargs):
+    """Blends from the first color to the last across the panels"""
+    return colorsAt(colors, np.linspace(0.0, 1.0, count))
+
+
+def noise(colors, count, scale=8.0, seed=None, **kwargs):
+    """Smooth value noise across the panels, picking colors along the gradient of the colors
+       Scale is the number of panels between two random values"""
+    rng = np.random.default_rng(seed)
+    lattice = rng.random(int(count / scale) + 2)
+    position = np.arange(count) / scale
+    index = position.astype(np.int64)
+    frac = position - index
+    frac = frac * frac * (3.0 - 2.0 * frac)
+    t = lattice[index] + (lattice[index + 1] - lattice[index]) * frac
+    return colorsAt(colors, t)
+
+
+FILLS = {
+    PALETTE: palette,
+    GRADIENT: gradient,
+    NOISE: noise
+}
+
+
+def computeFill(mode, colors, count, brightness=255, **kwargs):
+    """Returns the hue, saturation and brightness of count panels as uint8 arrays
+    @param colors: list of [hue 0-360, saturation 0-100]
+    """
+    hue, saturation = FILLS[mode](colors, count, **kwargs)
+    return (
+        toBytes(hue, 360.0),
+        toBytes(saturation, 100.0),
+        np.full(count, brightness, dtype=np.uint8)
+    )
+
+
+def applyFill(store, mode, colors, brightness=255, **kwargs):
+    """Computes a fill for every panel of the store and writes it into its arrays in place
+    @type store: PanelStore
+    """
+    count = len(store)
+    if not count:
+        return
+    hue, saturation, value = computeFill(mode, colors, count, brightness, **kwargs)
+    np.frombuffer(store.hue, dtype=np.uint8)[:] = hue
+    np.frombuffer(store.saturation, dtype=np.uint8)[:] = saturation
+    np.frombuffer(store.brightness, dtype=np.uint8)[:] = value
@@ -2,19 +2,20 @@
 import logging
 from typing import Any, Optional
 
-from . import effect
 from homeassistant import core
 from homeassistant.config_entries import ConfigEntry
+from homeassistant.core import callback
 from homeassistant.exceptions import PlatformNotReady
+from homeassistant.helpers import entity_registry as er
+from homeassistant.helpers.update_coordinator import CoordinatorEntity
 
 from .api import ColorWallConnectionError
-from .api import API
-from . import DOMAIN, CONTROLLER, fixDict, remap
+from . import DOMAIN, CONTROLLER, COORDINATOR, TRANSITIONS, remap
 
 # Import the device class from the component that you want to support
 from homeassistant.components.light import (
     ATTR_BRIGHTNESS, SUPPORT_EFFECT, SUPPORT_BRIGHTNESS, ATTR_EFFECT, LightEntity,
-    SUPPORT_COLOR, ATTR_HS_COLOR)
+    SUPPORT_COLOR, ATTR_HS_COLOR, ATTR_TRANSITION, SUPPORT_TRANSITION)
 
 _LOGGER = logging.getLogger(__name__)
 
@@ -22,55 +23,96 @@ _LOGGER = logging.getLogger(__name__)
 async def async_setup_entry(hass: core.HomeAssistant, config_entry: ConfigEntry, async_add_devices):
     """Add each light based on the passed data"""
     controller = hass.data[DOMAIN][config_entry.entry_id][CONTROLLER]
-
-    options = fixDict(config_entry.options)
-    _LOGGER.critical("Options: " + str(options))
-    for e in effect.effects:
-        effc = effect.effectIdByName(e)
-        if effc in options:
-            sett = effect.Settings(options[effc])
-            if sett is not None:
-                controller.effectSettings[effc] = (API.getEffectByName(e, sett))
-            else:
-                controller.effectSettings[effc] = (API.getEffectByName(e, effect.Settings({})))
-        else:
-            controller.effectSettings[effc] = (API.getEffectByName(e, effect.Settings({})))
-
-    new_devices = await hass.async_add_executor_job(
-        setup_main, controller
-    )
-
-    for p in controller.panels:
-        new_devices.append(ColorWallPanel(controller, p.id))
-
-    async_add_devices(new_devices, True)
-
-
-def setup_main(controller) -> list:
-    try:
-        return [ColorWallMain(controller)]
-    except ColorWallConnectionError as err:
-        _LOGGER.warning("Cannot connect to host %s", controller.ip)
-        raise PlatformNotReady() from err
-
-
-class ColorWallMain(LightEntity):
+    coordinator = hass.data[DOMAIN][config_entry.entry_id][COORDINATOR]
+    transitions = hass.data[DOMAIN][config_entry.entry_id][TRANSITIONS]
+
+    restored = await coordinator.async_restore()
+    if not restored:
+        # Without a stored state we have to ask the wall how many panels it has
+        await coordinator.async_refresh()
+        if not coordinator.last_update_success:
+            _LOGGER.warning("Cannot connect to host %s", controller.ip)
+            raise PlatformNotReady()
+
+    pids = list(controller.panels.ids)
+    _async_remove_stale_panels(hass, config_entry, controller.ip, pids)
+    main = ColorWallMain(coordinator, transitions)
+    new_devices = [main]
+    for pid in pids:
+        new_devices.append(ColorWallPanel(coordinator, transitions, pid))
+
+    async_add_devices(new_devices)
+
+    reloading = False
+
+    @callback
+    def checkPanels():
+        """Reloads the entry when the wall no longer has the panels the entities were created for,
+           such as when the stored state is older than a change of the wall"""
+        nonlocal reloading
+        if reloading or not coordinator.last_update_success or list(controller.panels.ids) == pids:
+            return
+        reloading = True
+        _LOGGER.info("The ColorWall at %s now has %d panels instead of %d, reloading it",
+                     controller.ip, len(controller.panels), len(pids))
+
+        async def reload():
+            # The entities are created from the stored state, it has to have the new panels
+            await coordinator.async_save()
+            await hass.config_entries.async_reload(config_entry.entry_id)
+
+        hass.async_create_task(reload())
+
+    config_entry.async_on_unload(coordinator.async_add_listener(checkPanels))
+    # Entities start from the last known state, the wall is refreshed and the initial settings
+    # are sent in the background so that startup does not wait on the device
+    hass.async_create_task(main.async_send_initial(refresh=restored))
+
+
+@callback
+def _async_remove_stale_panels(hass, config_entry, host, pids):
+    """Removes the panel entities of the entry the wall no longer has"""
+    registry = er.async_get(hass)
+    prefix = f"{host}-panel-"
+    current = {f"{prefix}{pid}" for pid in pids}
+    for entry in er.async_entries_for_config_entry(registry, config_entry.entry_id):
+        if entry.domain == "light" and entry.unique_id.startswith(prefix) and entry.unique_id not in current:
+            registry.async_remove(entry.entity_id)
+
+
+class ColorWallEntity(CoordinatorEntity):
+    """Writes its state only when the part of the wall it shows changed, or its availability"""
+    _shownAvailable = None
+
+    async def async_added_to_hass(self) -> None:
+        await super().async_added_to_hass()
+        self._shownAvailable = self.available
+
+    def _changed(self) -> bool:
+        """Whether the last update changed what the entity shows, entities that cannot tell always write"""
+        return True
+
+    @callback
+    def _handle_coordinator_update(self) -> None:
+        if self._changed() or self.available != self._shownAvailable:
+            self._shownAvailable = self.available
+            self.async_write_ha_state()
+
+
+class ColorWallMain(ColorWallEntity, LightEntity):
     """Representation of an Awesome Light."""
 
-    def __init__(self, controller):
+    def __init__(self, coordinator, transitions):
         """
-        @type controller: API
-        @param controller: API
+        @type coordinator: ColorWallCoordinator
+        @param coordinator: ColorWallCoordinator
+        @type transitions: TransitionScheduler
         """
-        self._controller = controller
-        self._controller.update()
+        super().__init__(coordinator)
+        self._controller = coordinator.controller
+        self._transitions = transitions
         self._name = "ColorWall"
         self._unique_id = f"{self._controller.ip}-main"
-        self._state = controller.powered
-        self._brightness = 255  # todo update this to control master brightness
-        self._effect = controller.currentEffect
-        self._available = True
-        self.sendInitial()  # send the initial settings so that changes are reflected immediately
 
     @property
     def name(self):
@@ -81,28 +123,28 @@ class ColorWallMain(LightEntity):
     def unique_id(self) -> Optional[str]:
         return self._unique_id
 
-    @property
-    def available(self) -> bool:
-        """Return True if the entity is available"""
-        return self._available
-
     @property
     def brightness(self):
         """Return the brightness of the light.
         This method is optional. Removing it indicates to Home Assistant
         that brightness is not supported for this light.
         """
-        return self._brightness
+        return self._controller.brightness
 
     @property
     def is_on(self):
         """Return true if light is on."""
-        return self._state
+        return self._controller.powered
 
     @property
     def effect(self):
         """Returns the current effect"""
-        return self._effect.name
+        if self._controller.currentEffect is None:
+            return None
+        return self._controller.currentEffect.name
+
+    def _changed(self) -> bool:
+        return self.coordinator.mainChanged
 
     @property
     def effect_list(self):
@@ -112,67 +154,80 @@ class ColorWallMain(LightEntity):
     @property
     def supported_features(self):
         """Flag supported features"""
-        return SUPPORT_BRIGHTNESS | SUPPORT_EFFECT
+        return SUPPORT_BRIGHTNESS | SUPPORT_EFFECT | SUPPORT_TRANSITION
 
-    def turn_on(self, **kwargs):
+    async def async_turn_on(self, **kwargs):
         """Instruct the light to turn on.
         You can skip the brightness part if your light does not support
         brightness control.
         """
-        if ATTR_BRIGHTNESS in kwargs:
-            self._controller.brightness = kwargs.get(ATTR_BRIGHTNESS, 255)
-            self._brightness = self._controller.brightness
+        brightness = kwargs.get(ATTR_BRIGHTNESS, self.brightness)
 
         if ATTR_EFFECT in kwargs:
-            service = kwargs[ATTR_EFFECT]
-            enumber = self._controller.getEffectIdByName(service)
-            effecte = self._controller.getEffectByName(service,
-                                                       self._controller.effectSettings[enumber].settings)
-            self._controller.setEffect(effecte)
-            self._effect = effecte
+            enumber = self._controller.getEffectIdByName(kwargs[ATTR_EFFECT])
+            await self._controller.async_set_configured_effect(enumber)
 
-        self._controller.setPower(True, self.brightness)
-        self._state = True
+        await self._async_set_power(True, brightness, kwargs.get(ATTR_TRANSITION))
 
-    def turn_off(self, **kwargs):
+    async def async_turn_off(self, **kwargs):
         """Instruct the light to turn off."""
-        self._controller.setPower(False, self.brightness)
-        self._state = False
+        await self._async_set_power(False, self.brightness, kwargs.get(ATTR_TRANSITION))
 
-    def update(self):
-        """Fetch new state data for this light.
-        This is the only method that should fetch new data for Home Assistant.
-        """
+    async def _async_set_power(self, powered, brightness, transition):
+        if transition:
+            await self._transitions.async_fade_power(powered, brightness, transition)
+        else:
+            self._transitions.cancelPower()
+            await self._controller.async_set_power(powered, brightness)
+        self.coordinator.async_commanded()
+
+    async def async_send_initial(self, refresh=False):
+        """Sends the configured settings of the current effect so that changes are reflected immediately
+           Refreshes the wall first when it still shows the restored state"""
+        if refresh:
+            await self.coordinator.async_refresh()
+            if not self.coordinator.last_update_success:
+                return
+        current = self._controller.currentEffect
+        if current is None:
+            return
         try:
-            self._controller.update()
-            self._state = self._controller.powered
-            self._brightness = self._controller.brightness
-            self._effect = self._controller.currentEffect
-            self._available = True
-        except ColorWallConnectionError as err:
-            _LOGGER.warning("Cannot connect to previously available host %s", self._controller.ip)
-            self._available = False
-
-    def sendInitial(self):
-        if self._effect is not None:
-            enumber = self._controller.getEffectIdByName(self._effect.name)
-            effecte = self._controller.getEffectByName(self._effect.name,
-                                                       self._controller.effectSettings[enumber].settings)
-            self._controller.setEffect(effecte)
-
-
-class ColorWallPanel(LightEntity):
-
-    def __init__(self, controller, pid):
+            await self._controller.async_set_configured_effect(current.effect)
+        except ColorWallConnectionError:
+            _LOGGER.warning("Cannot send the initial effect to %s", self._controller.ip)
+
+
+class ColorWallPanel(ColorWallEntity, LightEntity):
+
+    def __init__(self, coordinator, transitions, pid):
         """
-        @type controller: API
-        @param controller: API
+        @type coordinator: ColorWallCoordinator
+        @param coordinator: ColorWallCoordinator
+        @type transitions: TransitionScheduler
         """
-        self._controller = controller
+        super().__init__(coordinator)
+        self._controller = coordinator.controller
+        self._transitions = transitions
         self._pid = pid
-        self._panel = controller.panels[pid]
         self._unique_id = f"{self._controller.ip}-panel-{self._pid}"
-        self._available = False
+
+    @property
+    def _index(self):
+        """The position of the panel in the store, None when the wall no longer has it"""
+        return self._controller.panels.index(self._pid)
+
+    @property
+    def _panel(self):
+        """The panel as of the latest refresh of the wall"""
+        return self._controller.panels[self._index]
+
+    @property
+    def available(self) -> bool:
+        return super().available and self._index is not None
+
+    def _changed(self) -> bool:
+        index = self._index
+        return index is None or self.coordinator.panelChanged(index)
 
     @property
     def name(self):
@@ -195,17 +250,14 @@ class ColorWallPanel(LightEntity):
 
     @property
     def supported_features(self):
-        return SUPPORT_BRIGHTNESS | SUPPORT_COLOR
-
-    @property
-    def available(self) -> bool:
-        return self._available
+        return SUPPORT_BRIGHTNESS | SUPPORT_COLOR | SUPPORT_TRANSITION
 
     @property
     def is_on(self) -> bool:
         return not self._panel.brightness == 0 and self._controller.powered
 
-    def turn_on(self, **kwargs: Any) -> None:
+    async def async_turn_on(self, **kwargs: Any) -> None:
+        self._beginChange(kwargs)
         if ATTR_BRIGHTNESS in kwargs:
             self._panel.brightness = kwargs.get(ATTR_BRIGHTNESS, 255)
         else:
@@ -215,19 +267,23 @@ class ColorWallPanel(LightEntity):
         if ATTR_HS_COLOR in kwargs:
             self._panel.hue = remap(kwargs.get(ATTR_HS_COLOR, [0, 255])[0], 0, 360, 0, 255)
             self._panel.saturation = remap(kwargs.get(ATTR_HS_COLOR, [0, 255])[1], 0, 100, 0, 255)
-        self._controller.panels[self._pid] = self._panel
-        self._controller.setPanels(self._controller.panels)
+        await self._async_send(kwargs)
 
-    def turn_off(self, **kwargs: Any) -> None:
+    async def async_turn_off(self, **kwargs: Any) -> None:
+        self._beginChange(kwargs)
         self._panel.brightness = 0
-        self._controller.panels[self._pid] = self._panel
-        self._controller.setPanels(self._controller.panels)
+        await self._async_send(kwargs)
 
-    def update(self):
-        try:
-            self._controller.update()
-            self._panel = self._controller.panels[self._pid]
-            self._available = True
-        except ColorWallConnectionError as err:
-            _LOGGER.warning("Cannot connect to previously available host %s", self._controller.ip)
-            self._available = False
+    def _beginChange(self, kwargs):
+        """Called before the panel is changed, a transition has to know where it starts from"""
+        if kwargs.get(ATTR_TRANSITION):
+            self._transitions.prepare()
+        else:
+            self._transitions.cancelPanels()
+
+    async def _async_send(self, kwargs):
+        if kwargs.get(ATTR_TRANSITION):
+            await self._transitions.async_fade_panels(kwargs[ATTR_TRANSITION])
+        else:
+            await self._controller.async_queue_panels()
+        self.coordinator.async_commanded()
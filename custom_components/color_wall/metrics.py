@@ -0,0 +1,108 @@
+"""Counts the requests sent to a wall, per endpoint, to see which walls and endpoints are slow"""
+import bisect
+import time
+
+# Upper bounds in seconds of the latency histogram buckets, the last one catches everything slower
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, float("inf"))
+
+
+class EndpointMetrics:
+    """Traffic of one endpoint, such as GET /panels"""
+    __slots__ = ("requests", "errors", "timeouts", "bytesSent", "bytesReceived", "histogram",
+                 "latencyTotal", "latencyMax", "encodeTime", "decodeTime")
+
+    def __init__(self):
+        self.requests = 0
+        self.errors = 0
+        self.timeouts = 0
+        self.bytesSent = 0
+        self.bytesReceived = 0
+        self.histogram = [0] * len(LATENCY_BUCKETS)
+        self.latencyTotal = 0.0
+        self.latencyMax = 0.0
+        self.encodeTime = 0.0
+        self.decodeTime = 0.0
+
+    def observe(self, latency):
+        self.histogram[bisect.bisect_left(LATENCY_BUCKETS, latency)] += 1
+        self.latencyTotal += latency
+        if latency > self.latencyMax:
+            self.latencyMax = latency
+
+    @property
+    def answered(self):
+        return sum(self.histogram)
+
+    @property
+    def latencyMean(self):
+        answered = self.answered
+        return self.latencyTotal / answered if answered else None
+
+    def percentile(self, q):
+        """Upper bound of the bucket holding the q-th percentile of the latency, in seconds"""
+        answered = self.answered
+        if not answered:
+            return None
+        rank = answered * q / 100
+        seen = 0
+        for bound, count in zip(LATENCY_BUCKETS, self.histogram):
+            seen += count
+            if seen >= rank:
+                return min(bound, self.latencyMax)
+        return self.latencyMax
+
+    def asDict(self):
+        return {
+            "requests": self.requests,
+            "errors": self.errors,
+            "timeouts": self.timeouts,
+            "bytes_sent": self.bytesSent,
+            "bytes_received": self.bytesReceived,
+            "latency_mean": self.latencyMean,
+            "latency_p50": self.percentile(50),
+            "latency_p95": self.percentile(95),
+            "latency_p99": self.percentile(99),
+            "latency_max": self.latencyMax,
+            "latency_histogram": {
+                ("+Inf" if bound == float("inf") else str(bound)): count
+                for bound, count in zip(LATENCY_BUCKETS, self.histogram)
+            },
+            "encode_time": self.encodeTime,
+            "decode_time": self.decodeTime,
+        }
+
+
+class WallMetrics:
+    """Traffic of one wall by endpoint"""
+
+    def __init__(self):
+        self.endpoints = {}
+
+    def endpoint(self, method, path) -> EndpointMetrics:
+        key = f"{method} {path}"
+        metrics = self.endpoints.get(key)
+        if metrics is None:
+            metrics = self.endpoints[key] = EndpointMetrics()
+        return metrics
+
+    def decode(self, method, path, parse, data):
+        """Parses a response body, counting the time it took"""
+        started = time.perf_counter()
+        try:
+            return parse(data)
+        finally:
+            self.endpoint(method, path).decodeTime += time.perf_counter() - started
+
+    def encode(self, method, path, build, *args, **kwargs):
+        """Builds a request body, counting the time it took"""
+        started = time.perf_counter()
+        try:
+            return build(*args, **kwargs)
+        finally:
+            self.endpoint(method, path).encodeTime += time.perf_counter() - started
+
+    def total(self, attribute):
+        return sum(getattr(metrics, attribute) for metrics in self.endpoints.values())
+
+    def asDict(self):
+        return {key: metrics.asDict() for key, metrics in sorted(self.endpoints.items())}
@@ -1,16 +1,204 @@
 # A light panel
 # has an ID, a hue, and a brightness
-from collections import namedtuple
-from json import JSONEncoder
+from array import array
 
+from .profiling import profiled
 
-class Panel:
-    def __init__(self, id, hue, sat, brightness):
-        self.id = id
-        self.hue = hue
-        self.saturation = sat
-        self.brightness = brightness
+# Largest panel id the packed store holds
+MAX_PANEL_ID = 0xFFFF
 
 
-class PanelEncoder(JSONEncoder):
-    def default(self, o): return o.__dict__
+def _byte(value):
+    """Clamps a channel value to what the firmware stores, a single byte"""
+    return min(255, max(0, int(round(value))))
+
+
+def _checked(records):
+    """Converts panel records that do not fit the packed arrays as they are, clamping the channels
+       Raises ValueError for a record without a usable id or channel"""
+    if not isinstance(records, list):
+        raise ValueError(f"Expected a list of panels, got {records!r}")
+    ids, hue, saturation, brightness = array("H"), bytearray(), bytearray(), bytearray()
+    for r in records:
+        try:
+            pid = r["id"]
+            if isinstance(pid, bool) or not isinstance(pid, int) or not 0 <= pid <= MAX_PANEL_ID:
+                raise ValueError(f"invalid id {pid!r}")
+            channels = [_byte(r[channel]) for channel in ("hue", "saturation", "brightness")]
+        except (KeyError, TypeError, ValueError, OverflowError) as err:
+            raise ValueError(f"Invalid panel record {r!r}: {err}") from err
+        ids.append(pid)
+        hue.append(channels[0])
+        saturation.append(channels[1])
+        brightness.append(channels[2])
+    return ids, hue, saturation, brightness
+
+
+class PanelView:
+    """A panel of a PanelStore, reads and writes go straight to the packed arrays"""
+    __slots__ = ("_store", "_index")
+
+    def __init__(self, store, index):
+        self._store = store
+        self._index = index
+
+    @property
+    def id(self):
+        return self._store.ids[self._index]
+
+    @property
+    def hue(self):
+        return self._store.hue[self._index]
+
+    @hue.setter
+    def hue(self, value):
+        self._store.hue[self._index] = _byte(value)
+
+    @property
+    def saturation(self):
+        return self._store.saturation[self._index]
+
+    @saturation.setter
+    def saturation(self, value):
+        self._store.saturation[self._index] = _byte(value)
+
+    @property
+    def brightness(self):
+        return self._store.brightness[self._index]
+
+    @brightness.setter
+    def brightness(self, value):
+        self._store.brightness[self._index] = _byte(value)
+
+
+class PanelStore:
+    """The panels of a wall kept in packed arrays, one byte per panel and channel
+
+    Refreshing the wall overwrites the arrays in place and the views handed to the entities
+    stay the same, so polling does not allocate an object per panel every cycle."""
+
+    def __init__(self):
+        self.ids = array("H")
+        self.hue = bytearray()
+        self.saturation = bytearray()
+        self.brightness = bytearray()
+        self._views = []
+        self._positions = {}
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __getitem__(self, index):
+        return self._views[index]
+
+    def __iter__(self):
+        return iter(self._views)
+
+    def _resize(self, size):
+        self.ids = array("H", bytes(2 * size))
+        self.hue = bytearray(size)
+        self.saturation = bytearray(size)
+        self.brightness = bytearray(size)
+        self._views = [PanelView(self, i) for i in range(size)]
+        self._positions = {}
+
+    @profiled("PanelStore.load")
+    def load(self, records):
+        """Replaces the state with panel records as sent by the device
+           Channels outside of 0-255 are clamped, a record that cannot be stored raises ValueError
+           and leaves the state as it was
+        @type records: list
+        """
+        try:
+            ids = array("H", [r["id"] for r in records])
+            hue = bytearray([r["hue"] for r in records])
+            saturation = bytearray([r["saturation"] for r in records])
+            brightness = bytearray([r["brightness"] for r in records])
+        except (KeyError, TypeError, ValueError, OverflowError):
+            ids, hue, saturation, brightness = _checked(records)
+        if len(ids) != len(self.ids):
+            self._resize(len(ids))
+        # In place, views of the arrays stay valid
+        self.ids[:] = ids
+        self.hue[:] = hue
+        self.saturation[:] = saturation
+        self.brightness[:] = brightness
+        if len(self._positions) != len(ids) or any(self._positions.get(pid) != i for i, pid in enumerate(ids)):
+            self._positions = {pid: i for i, pid in enumerate(ids)}
+
+    def index(self, pid):
+        """Returns the index of the panel with the id, None when the wall has no such panel"""
+        return self._positions.get(pid)
+
+    def apply(self, records):
+        """Updates the panels named by id in the records, which may hold only some of the channels
+           Returns the indexes of the panels that were updated, records of unknown panels are ignored"""
+        updated = []
+        for r in records:
+            i = self._positions.get(r.get("id"))
+            if i is None:
+                continue
+            for channel in ("hue", "saturation", "brightness"):
+                if channel in r:
+                    getattr(self, channel)[i] = _byte(r[channel])
+            updated.append(i)
+        return updated
+
+    def snapshot(self):
+        """Returns a copy of the channels, to compare the wall against later"""
+        return bytes(self.hue), bytes(self.saturation), bytes(self.brightness)
+
+    def changed(self, snapshot):
+        """Returns the indexes of the panels that differ from the snapshot"""
+        if snapshot is None or len(snapshot[0]) != len(self.ids):
+            return list(range(len(self.ids)))
+        hue, saturation, brightness = snapshot
+        if self.hue == hue and self.saturation == saturation and self.brightness == brightness:
+            return []
+        return [
+            i for i, (h, s, b, oh, os, ob) in enumerate(zip(
+                self.hue, self.saturation, self.brightness, hue, saturation, brightness
+            )) if h != oh or s != os or b != ob
+        ]
+
+    def records(self):
+        """Returns the panels as records, the form PanelStore.load takes"""
+        return [{
+            "id": pid,
+            "hue": h,
+            "saturation": s,
+            "brightness": b
+        } for pid, h, s, b in zip(self.ids, self.hue, self.saturation, self.brightness)]
+
+
+class PanelPayloadEncoder:
+    """Builds the body of a /panels request as bytes straight from a PanelStore
+
+    The encoded record of every panel is cached together with the values it was made from,
+    so only the panels that changed since the last request are formatted again."""
+
+    def __init__(self):
+        self._cache = []
+
+    @profiled("PanelPayloadEncoder.encode")
+    def encode(self, store, indexes=None, snapshot=None):
+        """Returns the JSON list of the given panels, all of them by default
+           The channels are read from the snapshot if one is given"""
+        ids = store.ids
+        hue, saturation, brightness = snapshot if snapshot is not None else store.snapshot()
+        cache = self._cache
+        if len(cache) != len(ids):
+            cache = self._cache = [None] * len(ids)
+        if indexes is None:
+            indexes = range(len(ids))
+
+        parts = []
+        for i in indexes:
+            pid, h, s, b = ids[i], hue[i], saturation[i], brightness[i]
+            key = pid << 24 | h << 16 | s << 8 | b
+            entry = cache[i]
+            if entry is None or entry[0] != key:
+                entry = cache[i] = (key, b'{"id":%d,"hue":%d,"saturation":%d,"brightness":%d}' % (pid, h, s, b))
+            parts.append(entry[1])
+
+        return b"[" + b",".join(parts) + b"]"
@@ -0,0 +1,108 @@
+"""Profiles the poll and command paths for a bounded window, on demand
+
+While a window is open every function running on the event loop is profiled with cProfile, and the
+sections marked with @profiled additionally record their call count and wall time, awaits included.
+Outside of a window a marked section costs one attribute check.
+"""
+import asyncio
+import cProfile
+import functools
+import io
+import os
+import pstats
+import time
+
+# Functions listed in the summary, by cumulative time
+SUMMARY_LIMIT = 50
+
+
+class Profiler:
+    """The profiling window of the process, there is only one as cProfile allows only one"""
+
+    def __init__(self):
+        self.enabled = False
+        self.sections = {}
+        self._profile = None
+        self._started = None
+
+    def start(self):
+        if self.enabled:
+            raise RuntimeError("Profiling is already running")
+        profile = cProfile.Profile()
+        # Raises ValueError when another profiler, such as the profiler integration, is active
+        profile.enable()
+        self._profile = profile
+        self._started = time.monotonic()
+        self.sections = {}
+        self.enabled = True
+
+    def stop(self):
+        """Ends the window, returns the profile, the section timings and the length of the window"""
+        if not self.enabled:
+            raise RuntimeError("Profiling is not running")
+        self.enabled = False
+        self._profile.disable()
+        profile, self._profile = self._profile, None
+        return profile, self.sections, time.monotonic() - self._started
+
+    def record(self, name, elapsed):
+        section = self.sections.get(name)
+        if section is None:
+            section = self.sections[name] = [0, 0.0, 0.0]
+        section[0] += 1
+        section[1] += elapsed
+        if elapsed > section[2]:
+            section[2] = elapsed
+
+
+profiler = Profiler()
+
+
+def profiled(name):
+    """Marks a function or coroutine function as a section of the profiling summary"""
+
+    def decorate(fn):
+        if asyncio.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def wrapper(*args, **kwargs):
+                if not profiler.enabled:
+                    return await fn(*args, **kwargs)
+                started = time.perf_counter()
+                try:
+                    return await fn(*args, **kwargs)
+                finally:
+                    profiler.record(name, time.perf_counter() - started)
+        else:
+            @functools.wraps(fn)
+            def wrapper(*args, **kwargs):
+                if not profiler.enabled:
+                    return fn(*args, **kwargs)
+                started = time.perf_counter()
+                try:
+                    return fn(*args, **kwargs)
+                finally:
+                    profiler.record(name, time.perf_counter() - started)
+        return wrapper
+
+    return decorate
+
+
+def writeReport(directory, profile, sections, duration):
+    """Writes the profile and a summary of it, returns their paths
+       Blocking, run it in the executor"""
+    stamp = time.strftime("%Y%m%d-%H%M%S")
+    profilePath = os.path.join(directory, f"color_wall_profile_{stamp}.prof")
+    summaryPath = os.path.join(directory, f"color_wall_profile_{stamp}.txt")
+    profile.dump_stats(profilePath)
+
+    out = io.StringIO()
+    out.write(f"ColorWall profile over {duration:.1f}s\n\n")
+    out.write(f"{'section':<40} {'calls':>8} {'total ms':>10} {'mean ms':>10} {'max ms':>10}\n")
+    for name, (calls, total, longest) in sorted(sections.items(), key=lambda item: -item[1][1]):
+        out.write(f"{name:<40} {calls:>8} {total * 1000:>10.2f} {total * 1000 / calls:>10.3f} "
+                  f"{longest * 1000:>10.3f}\n")
+    out.write("\n")
+    pstats.Stats(profile, stream=out).sort_stats(pstats.SortKey.CUMULATIVE).print_stats(SUMMARY_LIMIT)
+    with open(summaryPath, "w") as summary:
+        summary.write(out.getvalue())
+    return profilePath, summaryPath
@@ -0,0 +1,89 @@
+"""Receives the state changes a wall pushes, so polling it is only needed as a slow fallback
+
+The wall reports changes made on the device itself, such as button presses or effect changes by
+the firmware, by POSTing JSON to the webhook of its config entry. Any of these keys may be present:
+
+    {"power": true, "brightness": 255,
+     "effect": {"effect": 4, "settings": {...}},
+     "panels": [{"id": 3, "hue": 120, "saturation": 255, "brightness": 200}]}
+
+A body that does not match is answered with a 400 and changes nothing.
+"""
+import logging
+
+import voluptuous as vol
+from aiohttp import web
+from homeassistant.components import webhook
+from homeassistant.config_entries import ConfigEntry
+from homeassistant.core import HomeAssistant
+from homeassistant.helpers.network import NoURLAvailableError, get_url
+
+from .coordinator import ColorWallCoordinator
+from .effect import registry
+from .panel import MAX_PANEL_ID
+
+_LOGGER = logging.getLogger(__name__)
+
+CONF_WEBHOOK_ID = "webhook_id"
+
+CHANNEL = vol.All(int, vol.Range(min=0, max=255))
+
+PANEL_SCHEMA = vol.Schema({
+    vol.Required("id"): vol.All(int, vol.Range(min=0, max=MAX_PANEL_ID)),
+    vol.Optional("hue"): CHANNEL,
+    vol.Optional("saturation"): CHANNEL,
+    vol.Optional("brightness"): CHANNEL,
+})
+
+EFFECT_SCHEMA = vol.Schema({
+    vol.Required("effect"): vol.In(registry.byId),
+    vol.Optional("settings", default={}): dict,
+})
+
+
+def validEffect(value):
+    """An effect the integration knows, with settings its schema accepts"""
+    value = EFFECT_SCHEMA(value)
+    return {**value, "settings": registry.schemas[value["effect"]](value["settings"])}
+
+
+PUSH_SCHEMA = vol.Schema({
+    vol.Optional("power"): bool,
+    vol.Optional("brightness"): CHANNEL,
+    vol.Optional("effect"): vol.Any(None, validEffect),
+    vol.Optional("panels"): [PANEL_SCHEMA],
+})
+
+
+def async_setup_push(hass: HomeAssistant, entry: ConfigEntry, coordinator: ColorWallCoordinator):
+    """Registers the webhook the wall of the entry pushes its changes to
+       Returns a callable that removes it again"""
+    if CONF_WEBHOOK_ID not in entry.data:
+        hass.config_entries.async_update_entry(
+            entry, data={**entry.data, CONF_WEBHOOK_ID: webhook.async_generate_id()}
+        )
+    webhookId = entry.data[CONF_WEBHOOK_ID]
+
+    async def handle(hass, webhookId, request):
+        try:
+            data = await request.json()
+        except ValueError:
+            return web.Response(status=400, text="Expected a JSON body")
+        try:
+            data = PUSH_SCHEMA(data)
+        except vol.Invalid as err:
+            _LOGGER.warning("Ignoring a malformed push from %s: %s", coordinator.controller.ip, err)
+            return web.Response(status=400, text=str(err))
+        coordinator.async_push(data)
+        return web.Response(status=200)
+
+    webhook.async_register(hass, entry.domain, f"ColorWall {coordinator.controller.ip}", webhookId, handle,
+                           local_only=True)
+    try:
+        url = get_url(hass, allow_external=False) + webhook.async_generate_path(webhookId)
+        _LOGGER.info("Point the ColorWall at %s to %s to push its changes", coordinator.controller.ip, url)
+    except NoURLAvailableError:
+        _LOGGER.info("The ColorWall at %s can push its changes to %s", coordinator.controller.ip,
+                     webhook.async_generate_path(webhookId))
+
+    return lambda: webhook.async_unregister(hass, webhookId)
@@ -0,0 +1,118 @@
+"""Shares the network between all walls so that dozens of them do not poll in bursts
+
+One RefreshScheduler lives in hass.data[DOMAIN]. It gives every wall a phase that spreads their
+poll cycles over the scan interval, and every request of every wall waits for a slot: at most
+MAX_PER_HOST in flight to one wall and MAX_IN_FLIGHT in total, all on Home Assistant's shared
+aiohttp session and its connection pool.
+"""
+import asyncio
+import collections
+import contextlib
+import time
+from datetime import timedelta
+
+# Requests in flight to all walls together and to a single wall
+MAX_IN_FLIGHT = 16
+MAX_PER_HOST = 2
+# Seconds of polls the reported throughput is averaged over
+THROUGHPUT_WINDOW = 300
+# Fraction of the scan interval between the phases of consecutive walls, spreads any number of
+# walls evenly without knowing how many there will be
+PHASE_STEP = 0.6180339887
+
+
+class RefreshScheduler:
+    """Staggers the polls of all walls and limits the requests in flight to them"""
+
+    def __init__(self, maxInFlight=MAX_IN_FLIGHT, maxPerHost=MAX_PER_HOST):
+        self.maxInFlight = maxInFlight
+        self.maxPerHost = maxPerHost
+        self._slots = asyncio.Semaphore(maxInFlight)
+        self._hostSlots = {}
+        self._phases = {}
+        self._registered = 0
+        self._polls = collections.deque()
+        self.inFlight = 0
+        self.stats = {
+            "requests": 0,
+            "maxInFlight": 0,
+            "queued": 0,
+            "queueDelayTotal": 0.0,
+            "queueDelayMax": 0.0,
+            "polls": 0,
+            "pollTimeTotal": 0.0,
+        }
+
+    def register(self, host, interval: timedelta) -> timedelta:
+        """Adds a wall, returns the phase its poll cycle is shifted by"""
+        if host not in self._phases:
+            fraction = (self._registered * PHASE_STEP) % 1.0
+            self._registered += 1
+            self._phases[host] = fraction
+            self._hostSlots[host] = asyncio.Semaphore(self.maxPerHost)
+        return interval * self._phases[host]
+
+    def unregister(self, host):
+        self._phases.pop(host, None)
+        self._hostSlots.pop(host, None)
+
+    @contextlib.asynccontextmanager
+    async def slot(self, host):
+        """Waits until a request to the host may be sent, the wait is counted as queue delay"""
+        hostSlots = self._hostSlots.get(host)
+        if hostSlots is None:
+            hostSlots = self._hostSlots[host] = asyncio.Semaphore(self.maxPerHost)
+        started = time.monotonic()
+        # The wall's own limit first, so a busy wall does not hold slots the others could use
+        async with hostSlots:
+            async with self._slots:
+                delay = time.monotonic() - started
+                stats = self.stats
+                stats["requests"] += 1
+                if delay > 0.001:
+                    stats["queued"] += 1
+                stats["queueDelayTotal"] += delay
+                stats["queueDelayMax"] = max(stats["queueDelayMax"], delay)
+                self.inFlight += 1
+                stats["maxInFlight"] = max(stats["maxInFlight"], self.inFlight)
+                try:
+                    yield
+                finally:
+                    self.inFlight -= 1
+
+    def polled(self, duration):
+        """Counts a finished poll cycle of a wall"""
+        now = time.monotonic()
+        self._polls.append(now)
+        while now - self._polls[0] > THROUGHPUT_WINDOW:
+            self._polls.popleft()
+        self.stats["polls"] += 1
+        self.stats["pollTimeTotal"] += duration
+
+    @property
+    def throughput(self):
+        """Polls per minute over all walls, over the last few minutes"""
+        now = time.monotonic()
+        recent = [polled for polled in self._polls if now - polled <= THROUGHPUT_WINDOW]
+        if len(recent) < 2:
+            return float(len(recent))
+        span = max(now - recent[0], 1.0)
+        return len(recent) * 60.0 / span
+
+    def asDict(self):
+        stats = self.stats
+        return {
+            "walls": len(self._phases),
+            "max_in_flight": self.maxInFlight,
+            "max_per_host": self.maxPerHost,
+            "in_flight": self.inFlight,
+            "peak_in_flight": stats["maxInFlight"],
+            "requests": stats["requests"],
+            "queued_requests": stats["queued"],
+            "queue_delay_mean": stats["queueDelayTotal"] / stats["requests"] if stats["requests"] else None,
+            "queue_delay_max": stats["queueDelayMax"],
+            "polls": stats["polls"],
+            "poll_time_mean": stats["pollTimeTotal"] / stats["polls"] if stats["polls"] else None,
+            "polls_per_minute": self.throughput,
+            "phases": dict(self._phases),
+        }
@@ -0,0 +1,177 @@
+"""Diagnostic sensors showing the traffic to a wall, disabled by default"""
+from typing import Optional
+
+from homeassistant import core
+from homeassistant.core import callback
+from homeassistant.components.sensor import SensorEntity, SensorStateClass
+from homeassistant.config_entries import ConfigEntry
+from homeassistant.helpers.entity import EntityCategory
+from homeassistant.helpers.update_coordinator import CoordinatorEntity
+
+from . import DOMAIN, COORDINATOR
+
+# Attribute of the wall metrics, name and unit of each traffic sensor
+TOTALS = (
+    ("requests", "Requests", None),
+    ("errors", "Request errors", None),
+    ("timeouts", "Request timeouts", None),
+    ("bytesSent", "Bytes sent", "B"),
+    ("bytesReceived", "Bytes received", "B"),
+)
+
+ENDPOINTS = (
+    ("GET", "/power"),
+    ("GET", "/panels"),
+    ("GET", "/effect"),
+    ("POST", "/power"),
+    ("POST", "/panels"),
+    ("PATCH", "/panels"),
+    ("POST", "/effect"),
+)
+
+
+async def async_setup_entry(hass: core.HomeAssistant, config_entry: ConfigEntry, async_add_devices):
+    """Add the traffic and latency sensors of the wall"""
+    coordinator = hass.data[DOMAIN][config_entry.entry_id][COORDINATOR]
+    sensors = [ColorWallTrafficSensor(coordinator, *total) for total in TOTALS]
+    sensors += [ColorWallLatencySensor(coordinator, method, path) for method, path in ENDPOINTS]
+    sensors.append(ColorWallCommandQueueSensor(coordinator))
+    async_add_devices(sensors)
+
+
+class ColorWallMetricsSensor(CoordinatorEntity, SensorEntity):
+    """Updated with every refresh of the wall, off unless enabled in the entity settings"""
+
+    def __init__(self, coordinator, key, name):
+        super().__init__(coordinator)
+        self._controller = coordinator.controller
+        self._name = f"ColorWall {name}"
+        self._unique_id = f"{self._controller.ip}-metrics-{key}"
+        self._written = None
+
+    @callback
+    def _handle_coordinator_update(self) -> None:
+        """The coordinator also calls this for every command, the state is only written when the
+           value or the attributes of the sensor changed"""
+        shown = self.native_value, self.extra_state_attributes
+        if shown != self._written:
+            self._written = shown
+            self.async_write_ha_state()
+
+    @property
+    def name(self):
+        return self._name
+
+    @property
+    def unique_id(self) -> Optional[str]:
+        return self._unique_id
+
+    @property
+    def available(self) -> bool:
+        # The metrics are worth seeing most when the wall cannot be reached
+        return True
+
+    @property
+    def entity_category(self):
+        return EntityCategory.DIAGNOSTIC
+
+    @property
+    def entity_registry_enabled_default(self) -> bool:
+        return False
+
+
+class ColorWallTrafficSensor(ColorWallMetricsSensor):
+    """Total of a counter over all endpoints of the wall"""
+
+    def __init__(self, coordinator, attribute, name, unit):
+        super().__init__(coordinator, attribute, name)
+        self._attribute = attribute
+        self._unit = unit
+
+    @property
+    def native_value(self):
+        return self._controller.metrics.total(self._attribute)
+
+    @property
+    def native_unit_of_measurement(self):
+        return self._unit
+
+    @property
+    def state_class(self):
+        return SensorStateClass.TOTAL_INCREASING
+
+
+class ColorWallLatencySensor(ColorWallMetricsSensor):
+    """Mean latency of one endpoint, with its percentiles and counters as attributes"""
+
+    def __init__(self, coordinator, method, path):
+        super().__init__(coordinator, f"{method.lower()}{path.replace('/', '-')}",
+                         f"{method} {path} latency")
+        self._endpoint = f"{method} {path}"
+
+    @property
+    def _metrics(self):
+        """The metrics of the endpoint, None until a request was sent to it"""
+        return self._controller.metrics.endpoints.get(self._endpoint)
+
+    @property
+    def native_value(self):
+        metrics = self._metrics
+        if metrics is None or metrics.latencyMean is None:
+            return None
+        return round(metrics.latencyMean * 1000, 1)
+
+    @property
+    def native_unit_of_measurement(self):
+        return "ms"
+
+    @property
+    def state_class(self):
+        return SensorStateClass.MEASUREMENT
+
+    @property
+    def extra_state_attributes(self):
+        metrics = self._metrics
+        if metrics is None:
+            return None
+        attributes = {
+            "requests": metrics.requests,
+            "errors": metrics.errors,
+            "timeouts": metrics.timeouts,
+            "bytes_sent": metrics.bytesSent,
+            "bytes_received": metrics.bytesReceived,
+            "encode_time_ms": round(metrics.encodeTime * 1000, 2),
+            "decode_time_ms": round(metrics.decodeTime * 1000, 2),
+        }
+        for q in (50, 95, 99):
+            value = metrics.percentile(q)
+            attributes[f"p{q}_ms"] = round(value * 1000, 1) if value is not None else None
+        return attributes
+
+
+class ColorWallCommandQueueSensor(ColorWallMetricsSensor):
+    """Commands waiting to be sent to the wall, with how long they waited as attributes"""
+
+    def __init__(self, coordinator):
+        super().__init__(coordinator, "command-queue", "Command queue")
+
+    @property
+    def native_value(self):
+        return self._controller.commands.depth
+
+    @property
+    def state_class(self):
+        return SensorStateClass.MEASUREMENT
+
+    @property
+    def extra_state_attributes(self):
+        queue = self._controller.commands.asDict()
+        attributes = {
+            "sent": queue["sent"],
+            "collapsed": queue["collapsed"],
+            "max_depth": queue["max_depth"],
+        }
+        for target, wait in queue["wait"].items():
+            attributes[f"{target}_wait_mean_ms"] = round(wait["mean"] * 1000, 1) if wait["mean"] is not None else None
+            attributes[f"{target}_wait_max_ms"] = round(wait["max"] * 1000, 1)
+        return attributes
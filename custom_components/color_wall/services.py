@@ -0,0 +1,268 @@
+"""Services that act on many panels at once, sending one request per wall instead of one per panel"""
+import asyncio
+import logging
+
+import numpy as np
+import voluptuous as vol
+from homeassistant.components import persistent_notification
+from homeassistant.components.light import ATTR_BRIGHTNESS, ATTR_HS_COLOR
+from homeassistant.core import HomeAssistant, ServiceCall
+from homeassistant.exceptions import HomeAssistantError
+import homeassistant.helpers.config_validation as cv
+from homeassistant.helpers.event import async_call_later
+
+from . import DOMAIN, CONTROLLER, COORDINATOR, STREAM, TRANSITIONS, remap
+from .api import ColorWallConnectionError
+from .fill import FILLS, GRADIENT, applyFill
+from .profiling import profiler, writeReport
+
+_LOGGER = logging.getLogger(__name__)
+
+SERVICE_SET_PANELS = "set_panels"
+SERVICE_FILL = "fill"
+SERVICE_START_PROFILING = "start_profiling"
+SERVICE_STOP_PROFILING = "stop_profiling"
+SERVICE_START_STREAM = "start_stream"
+SERVICE_STREAM_FRAME = "stream_frame"
+SERVICE_STOP_STREAM = "stop_stream"
+ATTR_PANELS = "panels"
+ATTR_WALL = "wall"
+ATTR_MODE = "mode"
+ATTR_COLORS = "colors"
+ATTR_SCALE = "scale"
+ATTR_SEED = "seed"
+ATTR_DURATION = "duration"
+
+# Key in hass.data[DOMAIN] of the callable cancelling the automatic end of the profiling window
+PROFILING = "profiling"
+
+HS_COLOR = vol.All(
+    vol.ExactSequence((
+        vol.All(vol.Coerce(float), vol.Range(min=0, max=360)),
+        vol.All(vol.Coerce(float), vol.Range(min=0, max=100))
+    )),
+    vol.Coerce(tuple)
+)
+
+PANEL_SCHEMA = vol.Schema({
+    vol.Required("id"): vol.All(vol.Coerce(int), vol.Range(min=0)),
+    vol.Optional(ATTR_HS_COLOR): HS_COLOR,
+    vol.Optional(ATTR_BRIGHTNESS): vol.All(vol.Coerce(int), vol.Range(min=0, max=255)),
+    vol.Optional(ATTR_WALL): cv.string,
+})
+
+SET_PANELS_SCHEMA = vol.Schema({
+    vol.Required(ATTR_PANELS): vol.All(cv.ensure_list, [PANEL_SCHEMA]),
+    vol.Optional(ATTR_WALL): cv.string,
+})
+
+FILL_SCHEMA = vol.Schema({
+    vol.Optional(ATTR_MODE, default=GRADIENT): vol.In(list(FILLS)),
+    vol.Required(ATTR_COLORS): vol.All(cv.ensure_list, vol.Length(min=1), [HS_COLOR]),
+    vol.Optional(ATTR_BRIGHTNESS, default=255): vol.All(vol.Coerce(int), vol.Range(min=0, max=255)),
+    vol.Optional(ATTR_SCALE, default=8.0): vol.All(vol.Coerce(float), vol.Range(min=1)),
+    vol.Optional(ATTR_SEED): vol.All(vol.Coerce(int), vol.Range(min=0, max=4294967295)),
+    vol.Optional(ATTR_WALL): cv.string,
+})
+
+WALL_SCHEMA = vol.Schema({
+    vol.Optional(ATTR_WALL): cv.string,
+})
+
+STREAM_FRAME_SCHEMA = vol.Schema({
+    vol.Required(ATTR_COLORS): vol.All(cv.ensure_list, vol.Length(min=1), [HS_COLOR]),
+    vol.Optional(ATTR_BRIGHTNESS, default=255): vol.All(
+        cv.ensure_list, vol.Length(min=1), [vol.All(vol.Coerce(int), vol.Range(min=0, max=255))]
+    ),
+    vol.Optional(ATTR_WALL): cv.string,
+})
+
+START_PROFILING_SCHEMA = vol.Schema({
+    vol.Optional(ATTR_DURATION, default=60): vol.All(vol.Coerce(float), vol.Range(min=1, max=3600)),
+})
+
+
+def walls(hass: HomeAssistant) -> dict:
+    """The set up walls by host, each as the dict its config entry keeps in hass.data"""
+    return {
+        data[CONTROLLER].ip: data for data in hass.data.get(DOMAIN, {}).values()
+        if isinstance(data, dict) and CONTROLLER in data
+    }
+
+
+def resolveWall(configured: dict, host):
+    """Picks the wall a service call addresses, the only one when no host is given"""
+    if host is None:
+        if len(configured) != 1:
+            raise HomeAssistantError("Name the wall, more than one ColorWall is set up")
+        return next(iter(configured))
+    if host not in configured:
+        raise HomeAssistantError(f"No ColorWall is set up at {host}")
+    return host
+
+
+def panelRecord(item) -> dict:
+    """Converts a validated service item to a panel record in the 0-255 ranges the device uses"""
+    record = {"id": item["id"]}
+    if ATTR_HS_COLOR in item:
+        hue, saturation = item[ATTR_HS_COLOR]
+        record["hue"] = round(remap(hue, 0, 360, 0, 255))
+        record["saturation"] = round(remap(saturation, 0, 100, 0, 255))
+    if ATTR_BRIGHTNESS in item:
+        record["brightness"] = item[ATTR_BRIGHTNESS]
+    return record
+
+
+async def async_send_panels(host, controller):
+    """Sends the cached panels of a wall, failing the service call when the wall does not take them"""
+    try:
+        sent = await controller.async_set_panels(controller.panels)
+    except ColorWallConnectionError as err:
+        raise HomeAssistantError(f"Cannot send the panels to the ColorWall at {host}") from err
+    if not sent:
+        raise HomeAssistantError(f"The ColorWall at {host} did not accept the panels")
+
+
+async def async_set_panels(hass: HomeAssistant, call: ServiceCall):
+    """Validates every item first, then sends the panels of each wall in a single request"""
+    configured = walls(hass)
+    grouped = {}
+    for item in call.data[ATTR_PANELS]:
+        host = resolveWall(configured, item.get(ATTR_WALL, call.data.get(ATTR_WALL)))
+        if configured[host][CONTROLLER].panels.index(item["id"]) is None:
+            raise HomeAssistantError(f"The ColorWall at {host} has no panel {item['id']}")
+        grouped.setdefault(host, []).append(panelRecord(item))
+
+    async def send(host, records):
+        controller = configured[host][CONTROLLER]
+        configured[host][TRANSITIONS].cancelPanels()
+        controller.panels.apply(records)
+        await async_send_panels(host, controller)
+        configured[host][COORDINATOR].async_commanded()
+
+    await asyncio.gather(*[send(host, records) for host, records in grouped.items()])
+
+
+async def async_fill(hass: HomeAssistant, call: ServiceCall):
+    """Paints a palette, gradient or noise over every panel of a wall and sends it in a single request"""
+    configured = walls(hass)
+    host = resolveWall(configured, call.data.get(ATTR_WALL))
+    wall = configured[host]
+    controller = wall[CONTROLLER]
+    wall[TRANSITIONS].cancelPanels()
+    applyFill(controller.panels, call.data[ATTR_MODE], call.data[ATTR_COLORS], call.data[ATTR_BRIGHTNESS],
+              scale=call.data[ATTR_SCALE], seed=call.data.get(ATTR_SEED))
+    await async_send_panels(host, controller)
+    wall[COORDINATOR].async_commanded()
+
+
+def streamingWall(hass: HomeAssistant, call: ServiceCall):
+    """The host and hass.data of the wall a stream service call addresses"""
+    configured = walls(hass)
+    host = resolveWall(configured, call.data.get(ATTR_WALL))
+    return host, configured[host]
+
+
+async def async_start_stream(hass: HomeAssistant, call: ServiceCall):
+    """Starts streaming the frames of stream_frame to a wall, the entities keep their state meanwhile"""
+    host, wall = streamingWall(hass, call)
+    wall[TRANSITIONS].cancelPanels()
+    await wall[STREAM].async_start()
+    _LOGGER.debug("Streaming to %s", host)
+
+
+async def async_stream_frame(hass: HomeAssistant, call: ServiceCall):
+    """Hands a frame with a color per panel, in the order of the wall, to the running stream
+       A single brightness applies to every panel"""
+    host, wall = streamingWall(hass, call)
+    stream = wall[STREAM]
+    if not stream.active:
+        raise HomeAssistantError(f"No stream is running on the ColorWall at {host}, call start_stream first")
+    colors = np.array(call.data[ATTR_COLORS], dtype=np.float64)
+    brightness = call.data[ATTR_BRIGHTNESS]
+    if len(brightness) == 1:
+        brightness = brightness * len(colors)
+    try:
+        stream.submit((
+            np.rint(remap(colors[:, 0], 0, 360, 0, 255)),
+            np.rint(remap(colors[:, 1], 0, 100, 0, 255)),
+            brightness,
+        ))
+    except ValueError as err:
+        raise HomeAssistantError(f"Cannot stream the frame to the ColorWall at {host}: {err}") from err
+
+
+async def async_stop_stream(hass: HomeAssistant, call: ServiceCall):
+    """Stops the stream, the wall and its entities take the last frame"""
+    host, wall = streamingWall(hass, call)
+    await wall[STREAM].async_stop()
+    wall[COORDINATOR].async_commanded()
+
+
+async def async_start_profiling(hass: HomeAssistant, call: ServiceCall):
+    """Opens a profiling window that ends after the duration, or earlier with stop_profiling"""
+    try:
+        profiler.start()
+    except (RuntimeError, ValueError) as err:
+        raise HomeAssistantError(f"Cannot start profiling: {err}") from err
+
+    async def stopLater(now):
+        hass.data[DOMAIN].pop(PROFILING, None)
+        await async_stop_profiling(hass)
+
+    hass.data[DOMAIN][PROFILING] = async_call_later(hass, call.data[ATTR_DURATION], stopLater)
+    _LOGGER.info("Profiling ColorWall for %.0f seconds", call.data[ATTR_DURATION])
+
+
+async def async_stop_profiling(hass: HomeAssistant, call: ServiceCall = None):
+    """Ends the profiling window and writes the profile and its summary to the config directory"""
+    cancel = hass.data[DOMAIN].pop(PROFILING, None)
+    if cancel is not None:
+        cancel()
+    try:
+        profile, sections, duration = profiler.stop()
+    except RuntimeError as err:
+        raise HomeAssistantError(str(err)) from err
+    profilePath, summaryPath = await hass.async_add_executor_job(
+        writeReport, hass.config.path(), profile, sections, duration
+    )
+    _LOGGER.info("Wrote the ColorWall profile to %s and its summary to %s", profilePath, summaryPath)
+    persistent_notification.async_create(
+        hass,
+        f"The profile is in {profilePath}, open it with snakeviz or pstats. The summary is in {summaryPath}.",
+        title="ColorWall profile",
+    )
+
+
+def async_setup_services(hass: HomeAssistant):
+    """Registers the services of the integration"""
+
+    async def handleSetPanels(call: ServiceCall):
+        await async_set_panels(hass, call)
+
+    async def handleFill(call: ServiceCall):
+        await async_fill(hass, call)
+
+    async def handleStartStream(call: ServiceCall):
+        await async_start_stream(hass, call)
+
+    async def handleStreamFrame(call: ServiceCall):
+        await async_stream_frame(hass, call)
+
+    async def handleStopStream(call: ServiceCall):
+        await async_stop_stream(hass, call)
+
+    async def handleStartProfiling(call: ServiceCall):
+        await async_start_profiling(hass, call)
+
+    async def handleStopProfiling(call: ServiceCall):
+        await async_stop_profiling(hass, call)
+
+    hass.services.async_register(DOMAIN, SERVICE_SET_PANELS, handleSetPanels, schema=SET_PANELS_SCHEMA)
+    hass.services.async_register(DOMAIN, SERVICE_FILL, handleFill, schema=FILL_SCHEMA)
+    hass.services.async_register(DOMAIN, SERVICE_START_STREAM, handleStartStream, schema=WALL_SCHEMA)
+    hass.services.async_register(DOMAIN, SERVICE_STREAM_FRAME, handleStreamFrame, schema=STREAM_FRAME_SCHEMA)
+    hass.services.async_register(DOMAIN, SERVICE_STOP_STREAM, handleStopStream, schema=WALL_SCHEMA)
+    hass.services.async_register(DOMAIN, SERVICE_START_PROFILING, handleStartProfiling,
+                                 schema=START_PROFILING_SCHEMA)
+    hass.services.async_register(DOMAIN, SERVICE_STOP_PROFILING, handleStopProfiling)
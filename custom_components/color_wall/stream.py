@@ -0,0 +1,158 @@
+"""Streams externally generated frames to a wall, for animations driven from Home Assistant
+
+Ambient sync or notification animations hand their frames to a FrameStream of the wall, through
+the start_stream, stream_frame and stop_stream services or directly:
+
+    stream = hass.data[DOMAIN][entry_id][STREAM]
+    await stream.async_start()
+    stream.submit((hue, saturation, brightness))  # 0-255 arrays, one value per panel
+    await stream.async_stop()
+
+or let it pull them from an async generator with async_stream. The frames are panel commands in
+the command queue of the wall and wait for a request slot like any other request, so they never
+run alongside a command or more polls than the wall is allowed. One frame is in flight at a time,
+and when the wall answers slower than frames arrive only the newest one is sent, the ones it
+replaced are counted as dropped.
+"""
+import asyncio
+import collections
+import logging
+import time
+
+import numpy as np
+
+from .api import AsyncAPI, ColorWallConnectionError, PANELS
+from .panel import PanelPayloadEncoder, PanelStore
+
+_LOGGER = logging.getLogger(__name__)
+
+# Seconds of sent frames the reported frame rate is averaged over
+FPS_WINDOW = 2.0
+
+
+class FrameStream:
+    """Sends the newest submitted frame to the wall whenever the previous one was answered"""
+
+    def __init__(self, controller: AsyncAPI):
+        self._controller = controller
+        self._task = None
+        self._frame = PanelStore()
+        self._encoder = PanelPayloadEncoder()
+        self._latest = None
+        self._ready = asyncio.Event()
+        self._sentAt = collections.deque()
+        self._delivered = False
+        self.stats = {"submitted": 0, "sent": 0, "dropped": 0, "errors": 0, "latency": None, "maxLatency": None}
+
+    @property
+    def active(self):
+        return self._task is not None and not self._task.done()
+
+    @property
+    def fps(self):
+        """Frames the wall received per second, over the last few seconds"""
+        now = time.monotonic()
+        while self._sentAt and now - self._sentAt[0] > FPS_WINDOW:
+            self._sentAt.popleft()
+        return len(self._sentAt) / FPS_WINDOW
+
+    async def async_start(self):
+        """Starts sending the submitted frames, until async_stop"""
+        if self.active:
+            return
+        if self._task is not None:
+            # The sender died, the write it began has to end before a new one begins
+            await self._async_end()
+        controller = self._controller
+        self._frame.load(controller.panels.records())
+        self._delivered = False
+        # Refreshes must not load the frames into the cache, the entities keep their state meanwhile
+        controller.beginWrite(PANELS)
+        self._task = asyncio.ensure_future(self._async_send_frames())
+
+    def submit(self, frame):
+        """Queues a frame for the wall, replacing the one still waiting to be sent
+        @param frame: hue, saturation and brightness, each a sequence of 0-255 with a value per panel
+        """
+        if len(frame) != 3 or any(len(channel) != len(self._frame) for channel in frame):
+            raise ValueError(f"Expected hue, saturation and brightness for {len(self._frame)} panels")
+        if self._latest is not None:
+            self.stats["dropped"] += 1
+        self._latest = (frame, time.monotonic())
+        self.stats["submitted"] += 1
+        self._ready.set()
+
+    async def async_stream(self, frames):
+        """Submits the frames of an async iterator until it ends or the stream stops"""
+        async for frame in frames:
+            if not self.active:
+                return
+            self.submit(frame)
+            # Let the sender pick the frame up before the producer makes the next one
+            await asyncio.sleep(0)
+
+    async def _async_send_frames(self):
+        controller = self._controller
+        store = self._frame
+        channels = [
+            np.frombuffer(channel, dtype=np.uint8) for channel in (store.hue, store.saturation, store.brightness)
+        ]
+        while True:
+            await self._ready.wait()
+            self._ready.clear()
+            frame, submitted = self._latest
+            self._latest = None
+            try:
+                for channel, values in zip(channels, frame):
+                    channel[:] = values
+                payload = self._encoder.encode(store)
+                ok = await controller.async_send_frame(payload)
+            except ColorWallConnectionError as err:
+                self.stats["errors"] += 1
+                _LOGGER.debug("Frame to %s failed: %s", controller.ip, err)
+                continue
+            except Exception:
+                # One bad frame must not end the stream
+                self.stats["errors"] += 1
+                _LOGGER.exception("Cannot send a frame to %s", controller.ip)
+                continue
+            if not ok:
+                self.stats["errors"] += 1
+                continue
+            latency = time.monotonic() - submitted
+            self.stats["sent"] += 1
+            self._delivered = True
+            self.stats["latency"] = latency
+            self.stats["maxLatency"] = max(latency, self.stats["maxLatency"] or 0.0)
+            self._sentAt.append(time.monotonic())
+
+    async def _async_end(self):
+        """Stops the sender and ends the write async_start began, however the sender ended"""
+        task, self._task = self._task, None
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+        except Exception:
+            _LOGGER.exception("Stream to %s failed", self._controller.ip)
+        finally:
+            self._controller.endWrite(PANELS)
+            self._latest = None
+
+    async def async_stop(self):
+        """Stops sending
+           The cache takes the last frame and is sent once more through the regular write path,
+           so the entities and the device agree on the state the animation ended in"""
+        if self._task is None:
+            return
+        await self._async_end()
+
+        controller = self._controller
+        if self._delivered and len(self._frame) == len(controller.panels):
+            for channel in ("hue", "saturation", "brightness"):
+                getattr(controller.panels, channel)[:] = getattr(self._frame, channel)
+            try:
+                await controller.async_set_panels(controller.panels)
+            except ColorWallConnectionError:
+                _LOGGER.warning("Cannot send the last frame of the stream to %s", controller.ip)
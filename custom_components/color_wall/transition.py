@@ -0,0 +1,186 @@
+"""Fades the panels and the brightness of a wall by streaming intermediate frames to it
+
+The cache, and so the entities, take the target state as soon as a transition starts. The frames
+in between are computed for the whole wall at once and sent at the frame rate; when the device
+takes longer than a frame to answer, the frames it missed are skipped rather than queued.
+"""
+import asyncio
+import logging
+
+import numpy as np
+
+from .api import AsyncAPI, ColorWallConnectionError, PANELS, POWER
+from .commands import DEFAULT_WRITE_WINDOW
+from .panel import PanelStore
+
+_LOGGER = logging.getLogger(__name__)
+
+DEFAULT_FPS = 20
+
+
+def channels(store):
+    """The hue, saturation and brightness of the store as uint8 arrays sharing its memory"""
+    return tuple(np.frombuffer(channel, dtype=np.uint8) for channel in (store.hue, store.saturation, store.brightness))
+
+
+class PanelFade:
+    """Interpolates every panel of a wall between two states, hue going the short way around"""
+
+    def __init__(self, start, target):
+        """
+        @param start: hue, saturation and brightness arrays to fade from
+        @param target: hue, saturation and brightness arrays to fade to
+        """
+        self.start = [np.asarray(channel, dtype=np.float64) for channel in start]
+        self.target = [np.array(channel, dtype=np.uint8) for channel in target]
+        self.delta = [t - s for s, t in zip(self.start, self.target)]
+        self.delta[0] = np.mod(self.delta[0] + 128, 256) - 128
+
+    def frame(self, t, out):
+        """Writes the state at t in 0-1 into the out arrays"""
+        out[0][:] = np.mod(np.rint(self.start[0] + self.delta[0] * t), 256)
+        out[1][:] = np.rint(self.start[1] + self.delta[1] * t)
+        out[2][:] = np.rint(self.start[2] + self.delta[2] * t)
+
+
+class TransitionScheduler:
+    """Runs the transitions of one wall, a newer command cancels the running one
+
+    Panel entities changed by one scene call async_fade_panels within the same write window and
+    share one transition of the whole wall, like their instant changes share one request."""
+
+    def __init__(self, controller: AsyncAPI, fps=DEFAULT_FPS, window=DEFAULT_WRITE_WINDOW):
+        self._controller = controller
+        self.fps = fps
+        self.window = window
+        self._panelTask = None
+        self._powerTask = None
+        self._pending = None
+        self._start = None
+        self._frame = PanelStore()
+        self.stats = {"transitions": 0, "frames": 0, "skipped": 0, "cancelled": 0}
+
+    @property
+    def running(self):
+        return self._panelTask is not None and not self._panelTask.done()
+
+    def _current(self):
+        """What the device shows right now, the last frame sent while a transition runs"""
+        if self.running:
+            return tuple(np.array(channel) for channel in channels(self._frame))
+        return tuple(np.array(channel) for channel in channels(self._controller.panels))
+
+    def prepare(self):
+        """Called before changing the cached panels to the target of a fade
+           Remembers the state the fade starts from, once per write window, and stops the running
+           fade there so it cannot send its frames over the new one"""
+        if self._pending is None:
+            self._start = self._current()
+            self.cancelPanels()
+
+    async def async_fade_panels(self, duration):
+        """Fades from the state before prepare to the cached panels over duration seconds
+           Waits only until the transition started, it runs in the background"""
+        if self._pending is None:
+            self._pending = asyncio.ensure_future(self._async_begin(duration))
+        pending = self._pending
+        try:
+            await asyncio.shield(pending)
+        except asyncio.CancelledError:
+            # A newer command cancelled the transition before it started, the cache holds its state
+            if not pending.cancelled():
+                raise
+
+    async def _async_begin(self, duration):
+        await asyncio.sleep(self.window)
+        self._pending = None
+        self.cancelPanels()
+        fade = PanelFade(self._start, channels(self._controller.panels))
+        self._panelTask = asyncio.ensure_future(self._async_run_panels(fade, duration))
+        # The frames are not cached, the entities take the target once here
+        self._controller.changed()
+
+    def cancelPanels(self):
+        """Stops the running panel transition, and the one waiting for its write window to close
+           The cache already holds the state they were heading to"""
+        if self._pending is not None:
+            self._pending.cancel()
+            self._pending = None
+            self.stats["cancelled"] += 1
+        if self.running:
+            self._panelTask.cancel()
+            self.stats["cancelled"] += 1
+
+    def cancelPower(self):
+        if self._powerTask is not None and not self._powerTask.done():
+            self._powerTask.cancel()
+            self.stats["cancelled"] += 1
+
+    def cancel(self):
+        self.cancelPanels()
+        self.cancelPower()
+
+    async def _async_frames(self, duration, send):
+        """Calls send with t from 0 to 1 once per frame, skipping the frames send took too long for"""
+        loop = asyncio.get_running_loop()
+        interval = 1.0 / self.fps
+        started = loop.time()
+        tick = 0
+        while True:
+            t = min(1.0, (loop.time() - started) / duration) if duration > 0 else 1.0
+            await send(t)
+            self.stats["frames"] += 1
+            if t >= 1.0:
+                return
+            elapsed = loop.time() - started
+            nextTick = max(tick + 1, int(elapsed / interval) + 1)
+            self.stats["skipped"] += nextTick - tick - 1
+            tick = nextTick
+            await asyncio.sleep(max(0.0, started + tick * interval - loop.time()))
+
+    async def _async_run_panels(self, fade, duration):
+        controller = self._controller
+        self.stats["transitions"] += 1
+        if len(self._frame) != len(controller.panels) or list(self._frame.ids) != list(controller.panels.ids):
+            self._frame.load(controller.panels.records())
+        out = channels(self._frame)
+
+        async def send(t):
+            fade.frame(t, out)
+            await controller.async_set_panels(self._frame, cached=False)
+
+        try:
+            with controller.writing(PANELS):
+                await self._async_frames(duration, send)
+                # The last frame is the target, which the cache holds, send it from there to have the
+                # device acknowledge it
+                await controller.async_set_panels(controller.panels)
+        except ColorWallConnectionError:
+            _LOGGER.warning("Transition on %s stopped, cannot reach the wall", controller.ip)
+
+    async def async_fade_power(self, powered, brightness, duration):
+        """Fades the brightness of the wall to the given one, then sets the power
+           The cache takes the target right away, the fade runs in the background"""
+        controller = self._controller
+        self.cancelPower()
+        start = controller.brightness if controller.powered else 0
+        end = brightness if powered else 0
+        controller.powered = powered
+        controller.brightness = brightness
+        controller.changed()
+        self._powerTask = asyncio.ensure_future(self._async_run_power(start, end, powered, brightness, duration))
+
+    async def _async_run_power(self, start, end, powered, brightness, duration):
+        controller = self._controller
+        self.stats["transitions"] += 1
+
+        async def send(t):
+            if t < 1.0:
+                await controller.async_send_power(True, round(start + (end - start) * t))
+
+        try:
+            with controller.writing(POWER):
+                await self._async_frames(duration, send)
+                await controller.async_set_power(powered, brightness)
+        except ColorWallConnectionError:
+            _LOGGER.warning("Transition on %s stopped, cannot reach the wall", controller.ip)
@@ -0,0 +1,43 @@
+"""Fixtures running the integration against the simulated wall of tools/simulator.py"""
+import os
+import sys
+import threading
+
+import pytest
+from pytest_homeassistant_custom_component.common import MockConfigEntry
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "tools"))
+
+import simulator  # noqa: E402
+
+from custom_components.color_wall import DOMAIN  # noqa: E402
+
+PANELS = 6
+
+
+@pytest.fixture(autouse=True)
+def auto_enable_custom_integrations(enable_custom_integrations):
+    yield
+
+
+@pytest.fixture
+def wall(socket_enabled):
+    """A simulated wall answering on a free local port, its state is in wall.wall"""
+    server = simulator.serve(panels=PANELS)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    server.host = "%s:%d" % server.server_address[:2]
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+async def entry(hass, wall):
+    """A config entry set up against the simulated wall"""
+    entry = MockConfigEntry(domain=DOMAIN, data={"host": wall.host}, options={})
+    entry.add_to_hass(hass)
+    assert await hass.config_entries.async_setup(entry.entry_id)
+    await hass.async_block_till_done()
+    yield entry
+    assert await hass.config_entries.async_unload(entry.entry_id)
+    await hass.async_block_till_done()
@@ -0,0 +1,258 @@
+"""Tests of AsyncAPI against the simulated wall"""
+import asyncio
+import socket
+import threading
+
+import aiohttp
+import pytest
+from homeassistant.helpers.aiohttp_client import async_get_clientsession
+
+from custom_components.color_wall.api import POWER, AsyncAPI, ColorWallConnectionError
+from custom_components.color_wall.panel import PanelPayloadEncoder
+
+
+async def connect(hass, wall, session=None):
+    controller = AsyncAPI(wall.host, session or async_get_clientsession(hass))
+    await controller.async_update()
+    wall.wall.resetStats()
+    return controller
+
+
+def requests(wall):
+    return wall.wall.stats()["requests"]
+
+
+async def test_changed_panels_are_patched(hass, wall):
+    controller = await connect(hass, wall)
+    controller.panels[2].hue = 100
+
+    assert await controller.async_set_panels(controller.panels)
+    assert controller.partialPanels is True
+    assert requests(wall) == {"PATCH /panels": 1}
+    assert wall.wall.panels[2]["hue"] == 100
+
+
+async def test_unchanged_panels_are_not_sent(hass, wall):
+    controller = await connect(hass, wall)
+
+    assert await controller.async_set_panels(controller.panels)
+    assert requests(wall) == {}
+
+
+async def test_falls_back_to_the_full_wall_when_patch_is_not_allowed(hass, wall):
+    wall.wall.partial = False
+    controller = await connect(hass, wall)
+    controller.panels[2].hue = 100
+
+    assert await controller.async_set_panels(controller.panels)
+    assert controller.partialPanels is False
+    assert requests(wall) == {"PATCH /panels": 1, "POST /panels": 1}
+    assert wall.wall.panels[2]["hue"] == 100
+
+    # Once the wall refused a PATCH, the full wall is sent right away
+    controller.panels[3].hue = 50
+    assert await controller.async_set_panels(controller.panels)
+    assert requests(wall) == {"PATCH /panels": 1, "POST /panels": 2}
+    assert wall.wall.panels[3]["hue"] == 50
+
+
+async def test_an_error_to_a_supported_patch_does_not_send_the_full_wall(hass, wall):
+    controller = await connect(hass, wall)
+    controller.panels[2].hue = 100
+    assert await controller.async_set_panels(controller.panels)
+
+    wall.wall.failureRate = 1.0
+    controller.panels[3].hue = 50
+    assert not await controller.async_set_panels(controller.panels)
+    assert controller.partialPanels is True
+    assert requests(wall) == {"PATCH /panels": 2}
+
+
+async def test_an_error_while_support_is_unknown_sends_the_full_wall(hass, wall):
+    controller = await connect(hass, wall)
+    wall.wall.failureRate = 1.0
+    controller.panels[2].hue = 100
+
+    assert not await controller.async_set_panels(controller.panels)
+    # A failing device says nothing about PATCH support, the next write tries it again
+    assert controller.partialPanels is None
+    assert requests(wall) == {"PATCH /panels": 1, "POST /panels": 1}
+
+
+async def test_only_writes_to_the_cache_tell_its_listeners(hass, wall):
+    controller = await connect(hass, wall)
+    changes = []
+    controller.onChange = lambda: changes.append(True)
+
+    assert await controller.async_send_power(True, 10)
+    assert await controller.async_send_frame(PanelPayloadEncoder().encode(controller.panels))
+    assert await controller.async_set_panels(controller.panels, cached=False)
+    assert changes == []
+
+    assert await controller.async_set_power(False, 100)
+    assert len(changes) == 1
+    # The device already confirmed it, the cache did not change
+    assert await controller.async_set_power(False, 100)
+    assert len(changes) == 1
+
+
+
+async def test_poll_that_started_before_a_write_is_dropped(hass, wall):
+    controller = await connect(hass, wall)
+    wall.wall.latency = 0.1
+    poll = asyncio.ensure_future(controller.async_update(force=True))
+    await asyncio.sleep(0.02)
+
+    # Reaches the wall after the poll read the old power
+    assert await controller.async_set_power(False, 100)
+    await poll
+
+    assert (controller.powered, controller.brightness) == (False, 100)
+    assert controller._confirmed[POWER] == (False, 100)
+    assert controller._inflight[POWER] == 0
+    assert wall.wall.power == {"power": False, "brightness": 100}
+
+
+async def test_poll_during_a_write_is_dropped(hass, wall):
+    controller = await connect(hass, wall)
+    wall.wall.latency = 0.1
+    write = asyncio.ensure_future(controller.async_set_power(False, 100))
+    await asyncio.sleep(0.02)
+    assert controller._inflight[POWER] == 1
+
+    await controller.async_update(force=True)
+    assert (controller.powered, controller.brightness) == (False, 100)
+    assert await write
+    assert controller._inflight[POWER] == 0
+
+
+async def test_push_during_a_write_is_ignored(hass, wall):
+    controller = await connect(hass, wall)
+    wall.wall.latency = 0.1
+    write = asyncio.ensure_future(controller.async_set_power(False, 100))
+    await asyncio.sleep(0.02)
+
+    controller.applyPush({"power": True, "brightness": 255})
+    assert (controller.powered, controller.brightness) == (False, 100)
+    assert await write
+    assert controller._confirmed[POWER] == (False, 100)
+
+    # Once the write is answered pushes apply again
+    controller.applyPush({"brightness": 30})
+    assert (controller.powered, controller.brightness) == (False, 30)
+    assert controller._confirmed[POWER] == (False, 30)
+
+
+async def test_only_the_newest_write_is_confirmed(hass, wall):
+    controller = await connect(hass, wall)
+    wall.wall.latency = 0.05
+    first = asyncio.ensure_future(controller.async_set_power(False, 100))
+    await asyncio.sleep(0.01)
+    second = asyncio.ensure_future(controller.async_set_power(True, 50))
+    await asyncio.sleep(0.01)
+    assert controller._inflight[POWER] == 2
+
+    assert await first
+    # The first write was answered, but the second is what the cache holds
+    assert controller._confirmed[POWER] != (False, 100)
+    assert await second
+    assert controller._confirmed[POWER] == (True, 50)
+
+    assert await controller.async_set_power(True, 50)
+    assert controller.writeStats[POWER]["skipped"] == 1
+    assert requests(wall) == {"POST /power": 2}
+
+
+async def test_poll_after_the_writes_applies_the_wall(hass, wall):
+    controller = await connect(hass, wall)
+    assert await controller.async_set_power(False, 100)
+    wall.wall.power = {"power": True, "brightness": 7}
+
+    await controller.async_update(force=True)
+    assert (controller.powered, controller.brightness) == (True, 7)
+    assert controller._confirmed[POWER] == (True, 7)
+
+@pytest.fixture
+async def session():
+    """A session opening a connection per request, so a wall taken offline cannot be reached"""
+    session = aiohttp.ClientSession(connector=aiohttp.TCPConnector(force_close=True))
+    yield session
+    await session.close()
+
+
+def takeOffline(wall):
+    wall.shutdown()
+    wall.server_close()
+
+
+def bringBack(wall):
+    """Answers on the same address again, with the state the wall had"""
+    wall.socket = socket.socket(wall.address_family, wall.socket_type)
+    wall.server_bind()
+    wall.server_activate()
+    threading.Thread(target=wall.serve_forever, daemon=True).start()
+
+
+async def test_breaker_opens_after_failed_refreshes(hass, wall, session):
+    controller = await connect(hass, wall, session)
+    breaker = controller.breaker
+    takeOffline(wall)
+
+    for _ in range(breaker.threshold - 1):
+        with pytest.raises(ColorWallConnectionError):
+            await controller.async_update(force=True)
+    # A refresh reads every endpoint but fails once
+    assert breaker.failures == breaker.threshold - 1
+    assert breaker.state == "closed"
+
+    with pytest.raises(ColorWallConnectionError):
+        await controller.async_update(force=True)
+    assert breaker.state == "open"
+    assert breaker.trips == 1
+
+
+async def test_open_breaker_fails_fast_then_probes_with_one_refresh(hass, wall, session):
+    controller = await connect(hass, wall, session)
+    breaker = controller.breaker
+    takeOffline(wall)
+    for _ in range(breaker.threshold):
+        with pytest.raises(ColorWallConnectionError):
+            await controller.async_update(force=True)
+    bringBack(wall)
+
+    # Back, but the breaker does not know yet
+    with pytest.raises(ColorWallConnectionError):
+        await controller.async_update(force=True)
+    controller.panels[2].hue = 100
+    with pytest.raises(ColorWallConnectionError):
+        await controller.async_set_panels(controller.panels)
+    assert requests(wall) == {}
+    assert breaker.shortCircuited == 2
+
+    breaker.openedAt -= breaker.resetTimeout
+    await controller.async_update(force=True)
+    # The probe is the whole refresh, not its first request
+    assert requests(wall) == {"GET /power": 1, "GET /panels": 1, "GET /effect": 1}
+    assert breaker.state == "closed"
+    assert breaker.failures == 0
+
+
+async def test_failed_probe_opens_the_breaker_again(hass, wall, session):
+    controller = await connect(hass, wall, session)
+    breaker = controller.breaker
+    takeOffline(wall)
+    for _ in range(breaker.threshold):
+        with pytest.raises(ColorWallConnectionError):
+            await controller.async_update(force=True)
+    openedAt = breaker.openedAt - breaker.resetTimeout
+    breaker.openedAt = openedAt
+
+    with pytest.raises(ColorWallConnectionError):
+        await controller.async_update(force=True)
+    assert breaker.state == "open"
+    assert breaker.openedAt > openedAt
+    assert breaker.trips == 1
+
+    bringBack(wall)
+    with pytest.raises(ColorWallConnectionError):
+        await controller.async_update(force=True)
@@ -0,0 +1,103 @@
+"""Tests of the order and collapsing of the commands of a wall"""
+import asyncio
+
+from custom_components.color_wall.api import COMMAND_PRIORITIES, EFFECT, PANELS, POWER
+from custom_components.color_wall.commands import CommandQueue
+
+
+class Device:
+    """Records the commands it is sent, holding each until released when gated"""
+
+    def __init__(self, gated=False):
+        self.sent = []
+        self.gate = asyncio.Event()
+        if not gated:
+            self.gate.set()
+
+    def command(self, name, result=True):
+        async def send():
+            self.sent.append(name)
+            await self.gate.wait()
+            return result
+        return send
+
+
+async def test_most_urgent_command_is_sent_first():
+    queue = CommandQueue(COMMAND_PRIORITIES)
+    device = Device(gated=True)
+
+    first = asyncio.ensure_future(queue.async_submit(PANELS, device.command("panels")))
+    await asyncio.sleep(0)
+    # Queued while the panels are in flight
+    waiting = [
+        asyncio.ensure_future(queue.async_submit(EFFECT, device.command("effect"))),
+        asyncio.ensure_future(queue.async_submit(POWER, device.command("power"))),
+    ]
+    await asyncio.sleep(0)
+    assert device.sent == ["panels"]
+    assert queue.depth == 2
+
+    device.gate.set()
+    await asyncio.gather(first, *waiting)
+    assert device.sent == ["panels", "power", "effect"]
+
+
+async def test_newer_command_supersedes_a_waiting_one():
+    queue = CommandQueue(COMMAND_PRIORITIES)
+    device = Device()
+
+    results = await asyncio.gather(
+        queue.async_submit(PANELS, device.command("old panels", "old"), delay=0.01),
+        queue.async_submit(PANELS, device.command("new panels", "new"), delay=0.01),
+    )
+
+    assert device.sent == ["new panels"]
+    # Both callers wait on the one request that was sent
+    assert results == ["new", "new"]
+    assert queue.stats["collapsed"] == 1
+    assert queue.stats["sent"] == 1
+
+
+async def test_command_in_flight_is_not_superseded():
+    queue = CommandQueue(COMMAND_PRIORITIES)
+    device = Device(gated=True)
+
+    first = asyncio.ensure_future(queue.async_submit(POWER, device.command("off", "off")))
+    await asyncio.sleep(0)
+    second = asyncio.ensure_future(queue.async_submit(POWER, device.command("on", "on")))
+    await asyncio.sleep(0)
+    device.gate.set()
+
+    assert await first == "off"
+    assert await second == "on"
+    assert device.sent == ["off", "on"]
+
+
+async def test_delay_waits_for_urgent_commands():
+    queue = CommandQueue(COMMAND_PRIORITIES)
+    device = Device()
+
+    await asyncio.gather(
+        queue.async_submit(PANELS, device.command("panels"), delay=0.05),
+        queue.async_submit(POWER, device.command("power")),
+    )
+
+    assert device.sent == ["power", "panels"]
+
+
+async def test_failure_reaches_the_caller_and_the_queue_carries_on():
+    queue = CommandQueue(COMMAND_PRIORITIES)
+    device = Device()
+
+    async def fail():
+        raise ConnectionError("unreachable")
+
+    failed, sent = await asyncio.gather(
+        queue.async_submit(POWER, fail),
+        queue.async_submit(EFFECT, device.command("effect")),
+        return_exceptions=True,
+    )
+
+    assert isinstance(failed, ConnectionError)
+    assert sent is True
+    assert device.sent == ["effect"]
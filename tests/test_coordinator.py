@@ -0,0 +1,125 @@
+"""Tests of when the coordinator polls and how it tells its entities what a poll changed"""
+from datetime import timedelta
+from unittest.mock import patch
+
+import pytest
+
+from custom_components.color_wall import COORDINATOR, DOMAIN
+from custom_components.color_wall.coordinator import (
+    CONFIRM_INTERVAL, CONFIRM_PERIOD, IDLE_AFTER, IDLE_INTERVAL, MAX_BACKOFF, PUSH_FALLBACK_INTERVAL, SCAN_INTERVAL,
+    PollSchedule,
+)
+
+
+@pytest.fixture
+def clock():
+    """The monotonic time the poll schedule sees, moved by changing its return_value"""
+    with patch("custom_components.color_wall.coordinator.time") as time:
+        time.monotonic.return_value = 1000.0
+        yield time.monotonic
+
+
+def test_schedule_polls_fast_after_a_command(clock):
+    schedule = PollSchedule()
+    schedule.commanded()
+    assert schedule.interval() == CONFIRM_INTERVAL
+
+    clock.return_value += CONFIRM_PERIOD
+    assert schedule.interval() == SCAN_INTERVAL
+
+
+def test_schedule_slows_down_once_idle(clock):
+    schedule = PollSchedule()
+    for _ in range(IDLE_AFTER - 1):
+        schedule.succeeded(False)
+    assert schedule.interval() == SCAN_INTERVAL
+
+    schedule.succeeded(False)
+    assert schedule.interval() == IDLE_INTERVAL
+    schedule.succeeded(True)
+    assert schedule.interval() == SCAN_INTERVAL
+
+
+def test_schedule_backs_off_with_jitter_while_unreachable(clock):
+    schedule = PollSchedule()
+    for failures in range(1, 12):
+        schedule.failed()
+        backoff = min(MAX_BACKOFF, SCAN_INTERVAL * 2 ** (failures - 1))
+        for _ in range(20):
+            assert backoff / 2 <= schedule.interval() <= backoff
+    assert schedule.interval() <= MAX_BACKOFF
+
+    schedule.succeeded(False)
+    assert schedule.interval() == SCAN_INTERVAL
+
+
+def test_schedule_falls_back_to_slow_polls_once_the_wall_pushes(clock):
+    schedule = PollSchedule()
+    schedule.failed()
+    schedule.pushed()
+    assert schedule.interval() == PUSH_FALLBACK_INTERVAL
+
+    # A command is still confirmed quickly
+    schedule.commanded()
+    assert schedule.interval() == CONFIRM_INTERVAL
+    schedule.succeeded(True)
+    assert schedule.pushing
+
+    # A change the wall did not push means the pushes cannot be trusted
+    clock.return_value += CONFIRM_PERIOD
+    schedule.succeeded(True)
+    assert not schedule.pushing
+    assert schedule.interval() == SCAN_INTERVAL
+
+
+def test_schedule_adds_the_phase_to_the_first_interval(clock):
+    schedule = PollSchedule(phase=timedelta(seconds=7))
+    assert schedule.interval() == SCAN_INTERVAL + timedelta(seconds=7)
+    assert schedule.interval() == SCAN_INTERVAL
+
+
+async def refresh(hass, entry):
+    coordinator = hass.data[DOMAIN][entry.entry_id][COORDINATOR]
+    await coordinator.async_refresh()
+    await hass.async_block_till_done()
+    return coordinator
+
+
+def updated(hass):
+    return {state.entity_id: state.last_updated for state in hass.states.async_all("light")}
+
+
+async def test_only_the_changed_panel_is_written(hass, entry, wall):
+    before = updated(hass)
+    wall.wall.panels[2]["hue"] = 200
+
+    coordinator = await refresh(hass, entry)
+
+    assert coordinator.changedPanels == {2}
+    assert not coordinator.mainChanged
+    after = updated(hass)
+    assert {entity for entity in after if after[entity] != before[entity]} == {"light.colorwall_panel_2"}
+    assert hass.states.get("light.colorwall_panel_2").attributes["hs_color"][0] > 0
+
+
+async def test_unchanged_poll_writes_nothing(hass, entry):
+    before = updated(hass)
+
+    coordinator = await refresh(hass, entry)
+
+    assert coordinator.changedPanels == set()
+    assert not coordinator.mainChanged
+    assert updated(hass) == before
+
+
+async def test_power_change_writes_every_entity(hass, entry, wall):
+    before = updated(hass)
+    wall.wall.power = {"power": False, "brightness": 255}
+
+    coordinator = await refresh(hass, entry)
+
+    assert coordinator.changedPanels is None
+    assert coordinator.mainChanged
+    after = updated(hass)
+    assert all(after[entity] != before[entity] for entity in after)
+    assert hass.states.get("light.colorwall_panel_0").state == "off"
@@ -0,0 +1,104 @@
+"""Tests of the packed panel store, its views and the payload encoder"""
+import json
+
+import pytest
+
+from custom_components.color_wall.panel import PanelPayloadEncoder, PanelStore
+
+
+def store(count=3):
+    panels = PanelStore()
+    panels.load([{"id": i, "hue": 10 * i, "saturation": 255, "brightness": 128} for i in range(count)])
+    return panels
+
+
+def test_load_packs_the_records():
+    panels = store()
+
+    assert list(panels.ids) == [0, 1, 2]
+    assert panels.hue == bytearray([0, 10, 20])
+    assert panels.index(2) == 2
+    assert panels.index(9) is None
+    assert panels.records()[1] == {"id": 1, "hue": 10, "saturation": 255, "brightness": 128}
+
+
+def test_load_clamps_channels_out_of_range():
+    panels = PanelStore()
+    panels.load([{"id": 0, "hue": 300, "saturation": -5, "brightness": 127.6}])
+
+    assert panels.records() == [{"id": 0, "hue": 255, "saturation": 0, "brightness": 128}]
+
+
+@pytest.mark.parametrize("records", [
+    {"id": 0},
+    [{"id": 0, "hue": 0, "saturation": 0}],
+    [{"id": -1, "hue": 0, "saturation": 0, "brightness": 0}],
+    [{"id": 0x10000, "hue": 0, "saturation": 0, "brightness": 0}],
+    [{"id": 0, "hue": "red", "saturation": 0, "brightness": 0}],
+])
+def test_invalid_records_leave_the_store_as_it_was(records):
+    panels = store()
+
+    with pytest.raises(ValueError):
+        panels.load(records)
+    assert panels.records() == store().records()
+
+
+def test_views_stay_valid_across_loads():
+    panels = store()
+    view = panels[1]
+
+    panels.load([{"id": i, "hue": 50, "saturation": 0, "brightness": 0} for i in range(3)])
+    assert view.hue == 50
+
+
+def test_view_writes_clamp_to_a_byte():
+    panels = store()
+
+    panels[0].hue = 256
+    panels[0].saturation = -1
+    panels[0].brightness = 99.5
+
+    assert (panels.hue[0], panels.saturation[0], panels.brightness[0]) == (255, 0, 100)
+
+
+def test_changed_against_a_snapshot():
+    panels = store()
+    snapshot = panels.snapshot()
+    assert panels.changed(snapshot) == []
+
+    panels[2].brightness = 0
+    assert panels.changed(snapshot) == [2]
+    assert panels.changed(None) == [0, 1, 2]
+
+
+def test_encoder_formats_only_changed_panels_again():
+    panels = store()
+    encoder = PanelPayloadEncoder()
+    assert json.loads(encoder.encode(panels)) == panels.records()
+    cached = list(encoder._cache)
+
+    panels[1].hue = 99
+    assert json.loads(encoder.encode(panels)) == panels.records()
+    assert encoder._cache[0] is cached[0]
+    assert encoder._cache[2] is cached[2]
+    assert encoder._cache[1] is not cached[1]
+
+
+def test_encoder_uses_the_snapshot_and_indexes():
+    panels = store()
+    snapshot = panels.snapshot()
+    panels[0].hue = 99
+
+    assert json.loads(PanelPayloadEncoder().encode(panels, [0], snapshot)) == [
+        {"id": 0, "hue": 0, "saturation": 255, "brightness": 128}
+    ]
+
+
+def test_encoder_cache_follows_a_resized_store():
+    panels = store()
+    encoder = PanelPayloadEncoder()
+    encoder.encode(panels)
+
+    panels.load([{"id": 7, "hue": 1, "saturation": 2, "brightness": 3}])
+    assert json.loads(encoder.encode(panels)) == [{"id": 7, "hue": 1, "saturation": 2, "brightness": 3}]
@@ -0,0 +1,62 @@
+"""Tests of the webhook a wall pushes its changes to"""
+import pytest
+
+from custom_components.color_wall import COORDINATOR, DOMAIN
+from custom_components.color_wall.push import CONF_WEBHOOK_ID
+
+
+@pytest.fixture
+async def push(hass, entry, hass_client_no_auth):
+    """Posts a body to the webhook of the entry, returns the response"""
+    client = await hass_client_no_auth()
+    url = f"/api/webhook/{entry.data[CONF_WEBHOOK_ID]}"
+
+    async def post(**kwargs):
+        response = await client.post(url, **kwargs)
+        await hass.async_block_till_done()
+        return response
+
+    return post
+
+
+async def test_push_updates_the_entities(hass, entry, push):
+    response = await push(json={"brightness": 40, "panels": [{"id": 2, "hue": 255, "brightness": 0}]})
+
+    assert response.status == 200
+    assert hass.states.get("light.colorwall").attributes["brightness"] == 40
+    assert hass.states.get("light.colorwall_panel_2").state == "off"
+    assert hass.data[DOMAIN][entry.entry_id][COORDINATOR].schedule.pushing
+
+
+async def test_push_of_an_effect(hass, entry, push):
+    response = await push(json={"effect": {"effect": 4, "settings": {"speed": 5}}})
+
+    assert response.status == 200
+    assert hass.states.get("light.colorwall").attributes["effect"] == "Color wash"
+
+
+@pytest.mark.parametrize("body", [
+    [1, 2],
+    {"panels": [5]},
+    {"panels": [{"id": 1, "hue": 300}]},
+    {"panels": [{"id": 1, "hue": 4.5}]},
+    {"power": "yes", "brightness": 999},
+    {"brightness": -1},
+    {"effect": {"effect": 99}},
+    {"effect": {"effect": 4, "settings": {"speed": "fast"}}},
+    {"unknown": True},
+])
+async def test_malformed_push_is_rejected(hass, entry, push, body):
+    before = hass.states.get("light.colorwall")
+
+    response = await push(json=body)
+
+    assert response.status == 400
+    assert hass.states.get("light.colorwall") == before
+    assert not hass.data[DOMAIN][entry.entry_id][COORDINATOR].schedule.pushing
+
+
+async def test_push_that_is_not_json_is_rejected(hass, entry, push):
+    response = await push(data=b"power=on")
+
+    assert response.status == 400
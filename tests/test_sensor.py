@@ -0,0 +1,28 @@
+"""Tests of the diagnostic sensors of a wall"""
+from unittest.mock import patch
+
+from homeassistant.components.sensor import DOMAIN as SENSOR
+from homeassistant.helpers import entity_registry as er
+
+from custom_components.color_wall import COORDINATOR, DOMAIN
+
+
+async def test_sensor_is_only_written_when_its_value_changed(hass, entry, wall):
+    registry = er.async_get(hass)
+    entityId = registry.async_get_entity_id("sensor", DOMAIN, f"{wall.host}-metrics-requests")
+    registry.async_update_entity(entityId, disabled_by=None)
+    await hass.config_entries.async_reload(entry.entry_id)
+    await hass.async_block_till_done()
+    coordinator = hass.data[DOMAIN][entry.entry_id][COORDINATOR]
+    sensor = hass.data[SENSOR].get_entity(entityId)
+    before = hass.states.get(entityId)
+
+    with patch.object(sensor, "async_write_ha_state", wraps=sensor.async_write_ha_state) as write:
+        # What a command does, without sending a request
+        coordinator.async_update_listeners()
+        assert not write.called
+
+        await coordinator.async_refresh()
+        await hass.async_block_till_done()
+        assert write.call_count == 1
+    assert int(hass.states.get(entityId).state) > int(before.state)
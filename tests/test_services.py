@@ -0,0 +1,24 @@
+"""Tests of the services painting many panels at once"""
+import pytest
+import voluptuous as vol
+
+from custom_components.color_wall import DOMAIN
+from custom_components.color_wall.services import SERVICE_FILL
+
+
+async def test_fill_with_a_seed_paints_the_same_noise(hass, entry, wall):
+    data = {"mode": "noise", "colors": [[0, 100], [240, 100]], "seed": 7}
+
+    await hass.services.async_call(DOMAIN, SERVICE_FILL, data, blocking=True)
+    painted = [panel["hue"] for panel in wall.wall.panels]
+    await hass.services.async_call(DOMAIN, SERVICE_FILL, dict(data, seed=8), blocking=True)
+    await hass.services.async_call(DOMAIN, SERVICE_FILL, data, blocking=True)
+
+    assert [panel["hue"] for panel in wall.wall.panels] == painted
+
+
+@pytest.mark.parametrize("seed", [-1, 4294967296])
+async def test_fill_rejects_a_seed_out_of_range(hass, entry, seed):
+    with pytest.raises(vol.Invalid):
+        await hass.services.async_call(DOMAIN, SERVICE_FILL, {"mode": "noise", "colors": [[0, 100]], "seed": seed},
+                                       blocking=True)
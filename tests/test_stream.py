@@ -0,0 +1,66 @@
+"""Tests of streaming frames to a wall"""
+import asyncio
+
+from custom_components.color_wall import CONTROLLER, DOMAIN, STREAM
+from custom_components.color_wall.api import PANELS
+
+from .conftest import PANELS as COUNT
+
+
+async def wait_for(condition):
+    for _ in range(200):
+        if condition():
+            return
+        await asyncio.sleep(0.01)
+    raise AssertionError("Timed out")
+
+
+async def test_stream_sends_the_frames_and_keeps_the_last(hass, entry, wall):
+    stream = hass.data[DOMAIN][entry.entry_id][STREAM]
+    controller = hass.data[DOMAIN][entry.entry_id][CONTROLLER]
+
+    await stream.async_start()
+    stream.submit(([100] * COUNT, [255] * COUNT, [50] * COUNT))
+    await wait_for(lambda: stream.stats["sent"] == 1)
+    await stream.async_stop()
+
+    assert wall.wall.panels[0]["hue"] == 100
+    assert controller.panels.hue[0] == 100
+    assert controller._inflight[PANELS] == 0
+
+
+async def test_bad_frame_does_not_end_the_stream(hass, entry, wall):
+    stream = hass.data[DOMAIN][entry.entry_id][STREAM]
+    controller = hass.data[DOMAIN][entry.entry_id][CONTROLLER]
+
+    await stream.async_start()
+    stream.submit((["x"] * COUNT, [0] * COUNT, [0] * COUNT))
+    await wait_for(lambda: stream.stats["errors"] == 1)
+    assert stream.active
+
+    stream.submit(([20] * COUNT, [255] * COUNT, [50] * COUNT))
+    await wait_for(lambda: stream.stats["sent"] == 1)
+    await stream.async_stop()
+    assert wall.wall.panels[0]["hue"] == 20
+    assert controller._inflight[PANELS] == 0
+
+
+async def test_stream_whose_sender_died_is_ended(hass, entry):
+    stream = hass.data[DOMAIN][entry.entry_id][STREAM]
+    controller = hass.data[DOMAIN][entry.entry_id][CONTROLLER]
+
+    async def die():
+        raise RuntimeError("sender died")
+
+    stream._ready.wait = die
+    await stream.async_start()
+    await wait_for(lambda: not stream.active)
+
+    # Starting again ends the write of the dead sender before beginning its own
+    await stream.async_start()
+    await wait_for(lambda: not stream.active)
+    assert controller._inflight[PANELS] == 1
+
+    await stream.async_stop()
+    assert controller._inflight[PANELS] == 0
+    await stream.async_stop()
@@ -0,0 +1,67 @@
+"""Tests of the transitions of a wall"""
+import asyncio
+
+from homeassistant.helpers.aiohttp_client import async_get_clientsession
+
+from custom_components.color_wall.api import AsyncAPI
+from custom_components.color_wall.transition import TransitionScheduler
+
+
+async def scheduler(hass, wall):
+    controller = AsyncAPI(wall.host, async_get_clientsession(hass))
+    await controller.async_update()
+    return TransitionScheduler(controller, window=0.05)
+
+
+async def test_fade_runs_to_the_target(hass, wall):
+    transitions = await scheduler(hass, wall)
+    transitions.prepare()
+    transitions._controller.panels[2].hue = 100
+
+    await transitions.async_fade_panels(0.1)
+    await transitions._panelTask
+
+    assert transitions.stats["transitions"] == 1
+    assert wall.wall.panels[2]["hue"] == 100
+
+
+async def test_command_cancels_a_fade_waiting_for_its_window(hass, wall):
+    transitions = await scheduler(hass, wall)
+    transitions.prepare()
+    transitions._controller.panels[2].hue = 100
+    fade = asyncio.ensure_future(transitions.async_fade_panels(0.1))
+    await asyncio.sleep(0)
+
+    transitions.cancelPanels()
+    # The caller of the cancelled fade is not cancelled with it
+    await fade
+    await asyncio.sleep(0.1)
+
+    assert transitions.stats["transitions"] == 0
+    assert not transitions.running
+    assert transitions.stats["cancelled"] == 1
+
+
+async def test_unload_cancels_a_fade_waiting_for_its_window(hass, wall):
+    transitions = await scheduler(hass, wall)
+    transitions.prepare()
+    fade = asyncio.ensure_future(transitions.async_fade_panels(0.1))
+    await asyncio.sleep(0)
+
+    transitions.cancel()
+    await fade
+    await asyncio.sleep(0.1)
+
+    assert transitions.stats["transitions"] == 0
+
+
+async def test_entities_show_the_target_while_fading(hass, entry):
+    await hass.services.async_call("light", "turn_on", {
+        "entity_id": "light.colorwall_panel_1", "brightness": 10, "transition": 0.3
+    }, blocking=True)
+    assert hass.states.get("light.colorwall_panel_1").attributes["brightness"] == 10
+
+    await hass.services.async_call("light", "turn_on", {
+        "entity_id": "light.colorwall", "brightness": 20, "transition": 0.3
+    }, blocking=True)
+    assert hass.states.get("light.colorwall").attributes["brightness"] == 20
@@ -0,0 +1,216 @@
+"""Measures the hot paths of the integration against simulated walls of growing size
+
+    python tools/benchmark.py
+    python tools/benchmark.py --panels 10 100 1000 --polls 100 --latency 0.01 --failure-rate 0.05
+
+For every wall size it reports:
+- requests per poll cycle and the latency percentiles of a refresh, for the sync API, the AsyncAPI
+  and the coordinator refreshing the main and panel light entities
+- the time to encode the /panels payload, cold and with the per-panel cache warm, and to decode it
+- the memory the cached state of the wall takes
+
+Run it before and after a change to a hot path to catch regressions.
+"""
+import argparse
+import asyncio
+import gc
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+
+import aiohttp
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+# Home Assistant loads its core components before any integration, importing the integration first
+# trips over a circular import between them
+import homeassistant.components.persistent_notification  # noqa: E402,F401
+from homeassistant.core import HomeAssistant  # noqa: E402
+from homeassistant.helpers.storage import Store  # noqa: E402
+from custom_components.color_wall.api import API, AsyncAPI, ColorWallConnectionError, parsePanels  # noqa: E402
+from custom_components.color_wall.coordinator import ColorWallCoordinator  # noqa: E402
+from custom_components.color_wall.light import ColorWallMain, ColorWallPanel  # noqa: E402
+from custom_components.color_wall.panel import PanelPayloadEncoder, PanelStore  # noqa: E402
+from custom_components.color_wall.transition import TransitionScheduler  # noqa: E402
+import simulator  # noqa: E402
+
+
+def percentiles(samples):
+    """Median, 95th and 99th percentile in milliseconds"""
+    if len(samples) < 2:
+        return [s * 1000 for s in samples * 3][:3]
+    cuts = statistics.quantiles(samples, n=100)
+    return statistics.median(samples) * 1000, cuts[94] * 1000, cuts[98] * 1000
+
+
+def timeit(fn, repeat):
+    """Best of a few runs of fn called repeat times, in seconds per call"""
+    best = float("inf")
+    for _ in range(5):
+        started = time.perf_counter()
+        for _ in range(repeat):
+            fn()
+        best = min(best, (time.perf_counter() - started) / repeat)
+    return best
+
+
+class Poller:
+    """Polls a wall and counts the requests every poll takes"""
+
+    def __init__(self, wall):
+        self.wall = wall
+        self.latencies = []
+        self.failed = 0
+        self.requests = 0
+
+    def start(self):
+        self.requests = self.wall.stats()["total"]
+
+    def done(self, started, ok=True):
+        if ok:
+            self.latencies.append(time.perf_counter() - started)
+        else:
+            self.failed += 1
+
+    def report(self, name, polls):
+        requests = (self.wall.stats()["total"] - self.requests) / polls
+        p50, p95, p99 = percentiles(self.latencies or [0.0])
+        print(f"  {name:<22} {requests:>9.2f} {p50:>8.2f}ms {p95:>8.2f}ms {p99:>8.2f}ms {self.failed:>7}")
+
+
+def pollSync(host, wall, polls):
+    poller = Poller(wall)
+    controller = API(host)
+    poller.start()
+    for _ in range(polls):
+        started = time.perf_counter()
+        try:
+            controller.update()
+            poller.done(started)
+        except ColorWallConnectionError:
+            poller.done(started, False)
+    return poller
+
+
+async def pollAsync(host, wall, polls, session):
+    poller = Poller(wall)
+    controller = AsyncAPI(host, session)
+    poller.start()
+    for _ in range(polls):
+        started = time.perf_counter()
+        try:
+            await controller.async_update()
+            poller.done(started)
+        except ColorWallConnectionError:
+            poller.done(started, False)
+    return poller
+
+
+async def pollEntities(host, wall, polls, session):
+    """Refreshes through the coordinator and computes the state of every light entity it changed,
+       what writing their state to Home Assistant starts with"""
+    with tempfile.TemporaryDirectory() as config:
+        hass = HomeAssistant(config)
+        controller = AsyncAPI(host, session)
+        coordinator = ColorWallCoordinator(hass, controller, Store(hass, 1, "color_wall.benchmark"))
+        await coordinator.async_refresh()
+        transitions = TransitionScheduler(controller)
+        entities = [ColorWallMain(coordinator, transitions)]
+        entities += [ColorWallPanel(coordinator, transitions, p.id) for p in controller.panels]
+        written = 0
+
+        def writeStates():
+            nonlocal written
+            for entity in entities:
+                if entity._changed():
+                    entity.state_attributes
+                    written += 1
+
+        coordinator.async_add_listener(writeStates)
+        poller = Poller(wall)
+        poller.start()
+        for _ in range(polls):
+            started = time.perf_counter()
+            await coordinator.async_refresh()
+            poller.done(started, coordinator.last_update_success)
+        await hass.async_stop(force=True)
+    return poller, written
+
+
+def codec(panels):
+    """Encode and decode time of the /panels payload of a wall, in microseconds"""
+    store = PanelStore()
+    store.load([{"id": i, "hue": i % 256, "saturation": 255, "brightness": 128} for i in range(panels)])
+    payload = PanelPayloadEncoder().encode(store)
+    repeat = max(1, 20000 // panels)
+    cold = timeit(lambda: PanelPayloadEncoder().encode(store), repeat)
+    encoder = PanelPayloadEncoder()
+    warm = timeit(lambda: encoder.encode(store), repeat)
+    decode = timeit(lambda: store.load(parsePanels(payload)), repeat)
+    return cold * 1e6, warm * 1e6, decode * 1e6, len(payload)
+
+
+async def memory(host):
+    """Bytes held by an AsyncAPI and its caches once it has refreshed and sent the panels"""
+    async with aiohttp.ClientSession() as session:
+        gc.collect()
+        tracemalloc.start()
+        before = tracemalloc.get_traced_memory()[0]
+        controller = AsyncAPI(host, session)
+        await controller.async_update()
+        controller.panels.brightness[0] ^= 1
+        await controller.async_set_panels(controller.panels)
+        gc.collect()
+        used = tracemalloc.get_traced_memory()[0] - before
+        tracemalloc.stop()
+        del controller
+    return used
+
+
+async def benchmark(server, polls):
+    host = "%s:%d" % server.server_address[:2]
+    wall = server.wall
+    panels = len(wall.panels)
+    print(f"{panels} panels")
+    print(f"  {'refresh':<22} {'req/poll':>9} {'p50':>10} {'p95':>10} {'p99':>10} {'failed':>7}")
+    loop = asyncio.get_running_loop()
+    (await loop.run_in_executor(None, pollSync, host, wall, polls)).report("API.update", polls)
+    async with aiohttp.ClientSession() as session:
+        (await pollAsync(host, wall, polls, session)).report("AsyncAPI.async_update", polls)
+        poller, written = await pollEntities(host, wall, polls, session)
+        poller.report("coordinator + entities", polls)
+    print(f"  entity states computed: {written} over {polls} polls of {panels + 1} entities")
+
+    cold, warm, decode, size = codec(panels)
+    print(f"  encode {cold:.1f}us cold, {warm:.1f}us warm, decode {decode:.1f}us, payload {size} bytes")
+    print(f"  memory {await memory(host) / 1024:.1f} KiB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--panels", type=int, nargs="+", default=[10, 100, 1000])
+    parser.add_argument("--polls", type=int, default=50, help="poll cycles to time per client")
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds the simulated wall takes to answer")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="share of requests the wall fails")
+    parser.add_argument("--wander", type=float, help="change a random panel every this many seconds")
+    args = parser.parse_args()
+
+    for panels in args.panels:
+        server = simulator.serve(panels=panels, latency=args.latency, failureRate=args.failure_rate)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        if args.wander:
+            threading.Thread(target=server.wall.wander, args=(args.wander,), daemon=True).start()
+        try:
+            asyncio.run(benchmark(server, args.polls))
+        finally:
+            server.shutdown()
+            server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+"""Measures how long the light platform keeps Home Assistant startup waiting per number of walls
+
+    python tools/benchmark_startup.py --latency 0.1
+
+"blocking" is the old setup, which created the entities only after three GETs and the initial
+effect POST reached every wall. "restored" loads the stored last known state of every wall from
+disk and creates its entities from it, the refresh and the effect push then run in the background;
+"background" is when those finished. Adding the entities to Home Assistant costs the same either
+way and is left out of both.
+"""
+import argparse
+import asyncio
+import logging
+import os
+import sys
+import tempfile
+import threading
+import time
+
+import aiohttp
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+# Home Assistant loads its core components before any integration, importing the integration first
+# trips over a circular import between them
+import homeassistant.components.persistent_notification  # noqa: E402,F401
+from homeassistant.core import HomeAssistant  # noqa: E402
+from homeassistant.helpers.storage import Store  # noqa: E402
+from custom_components.color_wall import effect  # noqa: E402
+from custom_components.color_wall.api import API, AsyncAPI  # noqa: E402
+from custom_components.color_wall.coordinator import ColorWallCoordinator  # noqa: E402
+from custom_components.color_wall.light import ColorWallMain, ColorWallPanel  # noqa: E402
+from custom_components.color_wall.transition import TransitionScheduler  # noqa: E402
+import simulator  # noqa: E402
+
+
+def startWalls(count, panels, latency):
+    servers = []
+    for _ in range(count):
+        server = simulator.serve(panels=panels, latency=latency)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+    return servers
+
+
+def host(server):
+    return "%s:%d" % server.server_address[:2]
+
+
+def blockingSetup(controller):
+    """What ColorWallMain.__init__ used to do in the executor"""
+    controller.update()
+    controller.setEffect(controller.currentEffect)
+
+
+def storeKey(index):
+    return f"color_wall.benchmark_{index}"
+
+
+def createEntities(coordinator):
+    """What the light platform creates for a wall, with the state each entity shows"""
+    transitions = TransitionScheduler(coordinator.controller)
+    entities = [ColorWallMain(coordinator, transitions)]
+    entities += [ColorWallPanel(coordinator, transitions, pid) for pid in coordinator.controller.panels.ids]
+    for entity in entities:
+        entity.state_attributes
+    return entities
+
+
+async def measure(servers, saved, config):
+    loop = asyncio.get_running_loop()
+    configured = effect.configuredEffects({})
+
+    started = time.perf_counter()
+    await asyncio.gather(*[
+        loop.run_in_executor(None, blockingSetup, API(host(server))) for server in servers
+    ])
+    blocking = time.perf_counter() - started
+
+    hass = HomeAssistant(config)
+    for i in range(len(servers)):
+        await Store(hass, 1, storeKey(i)).async_save(saved)
+
+    async with aiohttp.ClientSession() as session:
+        controllers = [AsyncAPI(host(server), session) for server in servers]
+        started = time.perf_counter()
+        for i, controller in enumerate(controllers):
+            controller.configureEffects(configured)
+            # A new store, the one that saved the state would hand it over without reading the file
+            coordinator = ColorWallCoordinator(hass, controller, Store(hass, 1, storeKey(i)))
+            await coordinator.async_restore()
+            createEntities(coordinator)
+        restored = time.perf_counter() - started
+
+        async def background(controller):
+            await controller.async_update()
+            await controller.async_set_configured_effect(controller.currentEffect.effect)
+
+        await asyncio.gather(*[background(controller) for controller in controllers])
+        caughtUp = time.perf_counter() - started
+
+    await hass.async_stop(force=True)
+    return blocking, restored, caughtUp
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--walls", type=int, nargs="+", default=[1, 10, 50])
+    parser.add_argument("--panels", type=int, default=60)
+    parser.add_argument("--latency", type=float, default=0.05, help="seconds the simulated walls take to answer")
+    args = parser.parse_args()
+    # The light entities still use the deprecated feature flags, every entity created warns about them
+    logging.getLogger("homeassistant.components.light").setLevel(logging.ERROR)
+
+    print(f"{'walls':>5} {'blocking':>10} {'restored':>10} {'background':>11}")
+    for count in args.walls:
+        servers = startWalls(count, args.panels, args.latency)
+        saved = API(host(servers[0]))
+        saved.update()
+        with tempfile.TemporaryDirectory() as config:
+            blocking, restored, caughtUp = asyncio.run(measure(servers, saved.dumpState(), config))
+        print(f"{count:>5} {blocking * 1000:>8.1f}ms {restored * 1000:>8.2f}ms {caughtUp * 1000:>9.1f}ms")
+        for server in servers:
+            server.shutdown()
+            server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""Measures the frame rate a FrameStream gets through to a simulated wall
+
+    python tools/benchmark_stream.py
+    python tools/benchmark_stream.py --panels 100 --fps 30 --seconds 5 --latency 0.002 0.02 0.05
+
+A producer submits a moving rainbow at the given frame rate while the stream sends it through the
+command queue and the request slots of a RefreshScheduler, like it does in Home Assistant. For every
+latency of the wall it reports the frames per second the wall received, how many frames were
+dropped because a newer one replaced them, and the time from submitting a frame to its answer.
+"""
+import argparse
+import asyncio
+import os
+import sys
+import threading
+import time
+
+import aiohttp
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+# Home Assistant loads its core components before any integration, importing the integration first
+# trips over a circular import between them
+import homeassistant.components.persistent_notification  # noqa: E402,F401
+from custom_components.color_wall.api import AsyncAPI  # noqa: E402
+from custom_components.color_wall.scheduler import RefreshScheduler  # noqa: E402
+from custom_components.color_wall.stream import FrameStream  # noqa: E402
+import simulator  # noqa: E402
+
+
+async def rainbow(panels, fps, seconds):
+    """Frames of a rainbow moving one hue step per frame, at the frame rate"""
+    loop = asyncio.get_running_loop()
+    interval = 1.0 / fps
+    started = loop.time()
+    saturation = np.full(panels, 255, dtype=np.uint8)
+    brightness = np.full(panels, 200, dtype=np.uint8)
+    for i in range(int(fps * seconds)):
+        yield (np.arange(i, i + panels) % 256).astype(np.uint8), saturation, brightness
+        await asyncio.sleep(max(0.0, started + (i + 1) * interval - loop.time()))
+
+
+async def measure(host, panels, fps, seconds):
+    async with aiohttp.ClientSession() as session:
+        controller = AsyncAPI(host, session, limiter=RefreshScheduler())
+        await controller.async_update()
+        stream = FrameStream(controller)
+        await stream.async_start()
+        started = time.perf_counter()
+        await stream.async_stream(rainbow(panels, fps, seconds))
+        elapsed = time.perf_counter() - started
+        await stream.async_stop()
+    return stream.stats, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--panels", type=int, default=100)
+    parser.add_argument("--fps", type=float, default=30, help="frames per second the producer submits")
+    parser.add_argument("--seconds", type=float, default=5, help="how long to stream for")
+    parser.add_argument("--latency", type=float, nargs="+", default=[0.002, 0.02, 0.05],
+                        help="seconds the simulated wall takes to answer")
+    args = parser.parse_args()
+
+    print(f"{args.panels} panels, {args.fps:g} fps submitted for {args.seconds:g}s")
+    print(f"  {'latency':>8} {'fps':>7} {'sent':>6} {'dropped':>8} {'errors':>7} {'last':>9} {'max':>9}")
+    for latency in args.latency:
+        server = simulator.serve(panels=args.panels, latency=latency)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        host = "%s:%d" % server.server_address[:2]
+        stats, elapsed = asyncio.run(measure(host, args.panels, args.fps, args.seconds))
+        print(f"  {latency * 1000:>6.0f}ms {stats['sent'] / elapsed:>7.1f} {stats['sent']:>6} {stats['dropped']:>8} "
+              f"{stats['errors']:>7} {(stats['latency'] or 0) * 1000:>7.1f}ms "
+              f"{(stats['maxLatency'] or 0) * 1000:>7.1f}ms")
+        server.shutdown()
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,248 @@
+"""A local stand-in for a ColorWall device
+
+Implements the /power, /panels and /effect endpoints of the firmware so the integration can be
+exercised without a physical wall. Point the integration at the printed host to use it.
+
+    python tools/simulator.py --panels 60
+    python tools/simulator.py --panels 60 --no-partial
+    python tools/simulator.py --push-url http://homeassistant.local:8123/api/webhook/<id> --wander 5
+    python tools/simulator.py --latency 0.05 --failure-rate 0.1
+
+With --push-url the simulator reports every state change to that URL like firmware with push
+support, and --wander makes it change a random panel now and then as if someone pressed a button.
+--failure-rate answers that share of the requests with a 500, like a device running out of memory.
+"""
+import argparse
+import collections
+import json
+import random
+import threading
+import time
+import urllib.request
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class Wall:
+    """The state of the simulated device"""
+
+    def __init__(self, panels, partial=True, latency=0.0, pushUrl=None, failureRate=0.0):
+        self.lock = threading.Lock()
+        self.partial = partial
+        self.latency = latency
+        self.failureRate = failureRate
+        self.pushUrl = pushUrl
+        self.pushed = 0
+        self.requests = collections.Counter()  # by "METHOD /path"
+        self.failures = 0
+        self.bytesReceived = 0
+        self.bytesSent = 0
+        self.power = {"power": True, "brightness": 255}
+        self.panels = [{"id": i, "hue": 0, "saturation": 0, "brightness": 255} for i in range(panels)]
+        self.effect = {"effect": 2, "settings": {}}
+
+    def count(self, method, path):
+        """Counts a request, returns whether it should fail"""
+        with self.lock:
+            self.requests[f"{method} {path}"] += 1
+            if self.failureRate and random.random() < self.failureRate:
+                self.failures += 1
+                return True
+        return False
+
+    def stats(self):
+        """The requests answered so far"""
+        with self.lock:
+            return {
+                "requests": dict(self.requests),
+                "total": sum(self.requests.values()),
+                "failures": self.failures,
+                "bytesReceived": self.bytesReceived,
+                "bytesSent": self.bytesSent,
+            }
+
+    def resetStats(self):
+        with self.lock:
+            self.requests.clear()
+            self.failures = 0
+            self.bytesReceived = 0
+            self.bytesSent = 0
+
+    def setPanels(self, records, partial):
+        """Applies posted panel records, returns an error message if they are rejected"""
+        if not isinstance(records, list):
+            return "Expected a list of panels"
+        if not partial and sorted(r.get("id") for r in records) != list(range(len(self.panels))):
+            return "Expected every panel of the wall"
+        for r in records:
+            if r.get("id") not in range(len(self.panels)):
+                return "Unknown panel " + str(r.get("id"))
+        for r in records:
+            self.panels[r["id"]].update(
+                {key: int(r[key]) for key in ("hue", "saturation", "brightness") if key in r}
+            )
+        self.push({"panels": [self.panels[r["id"]] for r in records]})
+        return None
+
+    def push(self, data):
+        """Reports a state change to the push URL, in the background like the firmware would"""
+        if self.pushUrl is None:
+            return
+        body = json.dumps(data).encode("utf-8")
+        threading.Thread(target=self._send, args=(body,), daemon=True).start()
+
+    def _send(self, body):
+        request = urllib.request.Request(self.pushUrl, body, {"Content-Type": "application/json"})
+        try:
+            with urllib.request.urlopen(request, timeout=5):
+                self.pushed += 1
+        except OSError as err:
+            print(f"Push to {self.pushUrl} failed: {err}")
+
+    def wander(self, interval):
+        """Changes a random panel every interval seconds, as if it was changed on the wall itself"""
+        while True:
+            time.sleep(interval)
+            with self.lock:
+                panel = random.choice(self.panels)
+                panel["hue"] = random.randrange(256)
+                self.push({"panels": [panel]})
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep connections alive like the firmware does
+    # Headers and body are written separately, with Nagle's algorithm every answer on a kept alive
+    # connection would wait for the delayed ACK of the client
+    disable_nagle_algorithm = True
+
+    def parse_request(self):
+        self._read = None
+        return super().parse_request()
+
+    def _simulate(self):
+        """Answers after the configured latency, like a device on a slow network
+           Returns whether the request was answered with a simulated failure"""
+        wall = self.server.wall
+        if wall.latency:
+            time.sleep(wall.latency)
+        if wall.count(self.command, self.path):
+            self._body()
+            self._reply(HTTPStatus.INTERNAL_SERVER_ERROR, {"error": "Simulated failure"})
+            return True
+        return False
+
+    def _reply(self, status, body=None):
+        data = json.dumps(body).encode("utf-8") if body is not None else b""
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+        self.server.wall.bytesSent += len(data)
+
+    def _body(self):
+        if self._read is None:
+            length = int(self.headers.get("Content-Length", 0))
+            self._read = self.rfile.read(length)
+            self.server.wall.bytesReceived += length
+        return json.loads(self._read or b"null")
+
+    def do_GET(self):
+        if self._simulate():
+            return
+        wall = self.server.wall
+        with wall.lock:
+            if self.path == "/power":
+                self._reply(HTTPStatus.OK, wall.power)
+            elif self.path == "/panels":
+                self._reply(HTTPStatus.OK, wall.panels)
+            elif self.path == "/effect":
+                self._reply(HTTPStatus.OK, wall.effect)
+            else:
+                self._reply(HTTPStatus.NOT_FOUND)
+
+    def do_POST(self):
+        if self._simulate():
+            return
+        wall = self.server.wall
+        body = self._body()
+        with wall.lock:
+            if self.path == "/power":
+                wall.power = {"power": bool(body["power"]), "brightness": int(body["brightness"])}
+                wall.push(wall.power)
+                self._reply(HTTPStatus.OK)
+            elif self.path == "/panels":
+                self._panels(body, partial=False)
+            elif self.path == "/effect":
+                wall.effect = {"effect": body["effect"], "settings": body.get("settings", {})}
+                wall.push({"effect": wall.effect})
+                self._reply(HTTPStatus.OK)
+            else:
+                self._reply(HTTPStatus.NOT_FOUND)
+
+    def do_PATCH(self):
+        if self._simulate():
+            return
+        wall = self.server.wall
+        body = self._body()
+        with wall.lock:
+            if self.path == "/panels" and wall.partial:
+                self._panels(body, partial=True)
+            else:
+                self._reply(HTTPStatus.METHOD_NOT_ALLOWED)
+
+    def _panels(self, records, partial):
+        error = self.server.wall.setPanels(records, partial)
+        if error is None:
+            self._reply(HTTPStatus.OK)
+        else:
+            self._reply(HTTPStatus.BAD_REQUEST, {"error": error})
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+
+def serve(host="127.0.0.1", port=0, panels=60, partial=True, latency=0.0, pushUrl=None, verbose=False,
+          failureRate=0.0):
+    """Creates a simulator server, call serve_forever on it to start answering requests
+       Port 0 picks a free port, server.server_address holds the one in use"""
+    server = ThreadingHTTPServer((host, port), Handler)
+    server.daemon_threads = True
+    server.wall = Wall(panels, partial, latency, pushUrl, failureRate)
+    server.verbose = verbose
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--panels", type=int, default=60, help="number of panels on the wall")
+    parser.add_argument("--no-partial", dest="partial", action="store_false",
+                        help="reject PATCH /panels like firmware without partial updates")
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds to wait before answering a request")
+    parser.add_argument("--failure-rate", type=float, default=0.0,
+                        help="share of the requests to answer with an error, 0 to 1")
+    parser.add_argument("--push-url", help="URL to report state changes to")
+    parser.add_argument("--wander", type=float, help="change a random panel every this many seconds")
+    parser.add_argument("--verbose", action="store_true", help="log every request")
+    args = parser.parse_args()
+
+    server = serve(args.host, args.port, args.panels, args.partial, args.latency, args.push_url, args.verbose,
+                   args.failure_rate)
+    host, port = server.server_address[:2]
+    print(f"Simulating a {args.panels} panel ColorWall on {host}:{port}")
+    if args.wander:
+        threading.Thread(target=server.wall.wander, args=(args.wander,), daemon=True).start()
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        print(json.dumps(server.wall.stats(), indent=2))
+
+
+if __name__ == "__main__":
+    main()